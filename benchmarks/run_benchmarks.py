@@ -0,0 +1,264 @@
+"""Offline benchmarks for the sender and receiver pipelines.
+
+Synthetic videos are generated at several resolutions, lengths and motion
+levels, then run through create_inputs and the reconstruction loop with a
+deterministic stub interpolator (no TensorFlow or network needed) and,
+optionally, the real FILM Interpolator.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmarks --interpolator stub --output-dir bench_results
+    python -m benchmarks.run_benchmarks --interpolator both --resolutions 640x360 --lengths 60
+"""
+import os
+import csv
+import json
+import time
+import argparse
+import logging
+import tempfile
+import threading
+import itertools
+import numpy as np
+from benchmarks.stub_interpolator import StubInterpolator
+from benchmarks.synthetic import MOTION_LEVELS, write_keyframe_inputs, write_source_video
+from pipeline.create_inputs import create_inputs
+from pipeline.profiler import Profiler, activate, current_rss_bytes
+from pipeline.reconstruction import reconstruct_video
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(__file__), "thresholds.json")
+
+
+class PeakMemorySampler:
+    """
+    Samples this process's RSS on a background thread and keeps the peak.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, current_rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_bytes = current_rss_bytes()
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, current_rss_bytes())
+        return False
+
+
+def _percentiles(values):
+    if not values:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+
+def run_receiver_case(work_dir, interpolator_name, interpolator, width, height, num_frames, motion, gap, batch_size):
+    """
+    Times create_inputs and reconstruction for one synthetic video.
+    """
+    video_path, indices_path, _ = write_keyframe_inputs(work_dir, width, height, num_frames, motion, gap)
+    output_path = os.path.join(work_dir, "reconstructed.mp4")
+
+    segment_latencies = []
+    last_tick = [0.0]
+
+    def callback(p, msg):
+        now = time.perf_counter()
+        segment_latencies.append((now - last_tick[0]) * 1000)
+        last_tick[0] = now
+
+    profiler = Profiler(job_id=f"{interpolator_name}/{width}x{height}_{num_frames}f_{motion}_gap{gap}")
+    with PeakMemorySampler() as memory, activate(profiler):
+        start = time.perf_counter()
+        frame_store, inputs, _ = create_inputs(indices_path, video_path)
+        prepared = time.perf_counter()
+        last_tick[0] = prepared
+        frames_written = reconstruct_video(frame_store, inputs, output_path, interpolator=interpolator,
+                                           batch_size=batch_size, progress_callback=callback)
+        finished = time.perf_counter()
+        frame_store.close()
+
+    return {
+        'case': profiler.job_id,
+        'pipeline': "receiver",
+        'interpolator': interpolator_name,
+        'width': width,
+        'height': height,
+        'frames': num_frames,
+        'motion': motion,
+        'gap': gap,
+        'frames_written': frames_written,
+        'create_inputs_seconds': prepared - start,
+        'reconstruct_seconds': finished - prepared,
+        'frames_per_sec': frames_written / (finished - start),
+        'segment_latency_ms': _percentiles(segment_latencies),
+        'peak_rss_mb': memory.peak_bytes / 1024 ** 2,
+        'stages': profiler.summary(),
+    }
+
+
+def run_sender_case(work_dir, width, height, num_frames, motion):
+    """
+    Times metric computation and keyframe video creation with KeyframeSelector.
+    The cascaded metrics engine is compared against the exhaustive compute_metrics.
+    """
+    from video_compressor import KeyframeSelector
+    from pipeline.metrics_engine import compute_selector_metrics
+
+    video_path = write_source_video(work_dir, width, height, num_frames, motion)
+    cwd = os.getcwd()
+    os.chdir(work_dir)  # KeyframeSelector writes its outputs relative to the working directory
+    try:
+        with PeakMemorySampler() as memory:
+            start = time.perf_counter()
+            selector = KeyframeSelector(video_path, verbose=False)
+            selector.compute_metrics(callback=lambda p, msg: None)
+            exact_metrics = selector.metrics.copy()
+            exact_done = time.perf_counter()
+            metrics_report = compute_selector_metrics(selector)
+            metrics_done = time.perf_counter()
+            selector.select_keyframes(adapt_factor=1.0)
+            selector.create_compressed_video(callback=lambda p, msg: None)
+            finished = time.perf_counter()
+    finally:
+        os.chdir(cwd)
+
+    return {
+        'case': f"sender/{width}x{height}_{num_frames}f_{motion}",
+        'pipeline': "sender",
+        'width': width,
+        'height': height,
+        'frames': num_frames,
+        'motion': motion,
+        'exact_metrics_seconds': exact_done - start,
+        'metrics_seconds': metrics_done - exact_done,
+        'metrics_speedup': (exact_done - start) / (metrics_done - exact_done),
+        'metrics_exact_fraction': metrics_report['exact_fraction'],
+        'max_difference_error': float(np.abs(selector.metrics[:, 3] - exact_metrics[:, 3]).max()),
+        'compress_seconds': finished - metrics_done,
+        'frames_per_sec': num_frames / (finished - exact_done),
+        'peak_rss_mb': memory.peak_bytes / 1024 ** 2,
+    }
+
+
+def check_thresholds(results, thresholds):
+    """
+    Returns a list of human-readable threshold violations.
+    """
+    failures = []
+    for result in results:
+        limits = dict(thresholds.get('default', {}).get(result['pipeline'], {}))
+        limits.update(thresholds.get('cases', {}).get(result['case'], {}))
+
+        if 'min_frames_per_sec' in limits and result['frames_per_sec'] < limits['min_frames_per_sec']:
+            failures.append(f"{result['case']}: {result['frames_per_sec']:.2f} frames/sec "
+                            f"< {limits['min_frames_per_sec']}")
+        if 'max_peak_rss_mb' in limits and result['peak_rss_mb'] > limits['max_peak_rss_mb']:
+            failures.append(f"{result['case']}: peak RSS {result['peak_rss_mb']:.0f} MB "
+                            f"> {limits['max_peak_rss_mb']}")
+        p95 = result.get('segment_latency_ms', {}).get('p95')
+        if 'max_p95_segment_ms' in limits and p95 is not None and p95 > limits['max_p95_segment_ms']:
+            failures.append(f"{result['case']}: p95 segment latency {p95:.1f} ms "
+                            f"> {limits['max_p95_segment_ms']}")
+        speedup = result.get('metrics_speedup')
+        if 'min_metrics_speedup' in limits and speedup is not None and speedup < limits['min_metrics_speedup']:
+            failures.append(f"{result['case']}: metrics speedup {speedup:.2f}x "
+                            f"< {limits['min_metrics_speedup']}")
+    return failures
+
+
+def write_results(results, output_dir):
+    """
+    Writes results.json (full detail) and results.csv (one flat row per case).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    json_path = os.path.join(output_dir, "results.json")
+    with open(json_path, "w") as f:
+        json.dump({'created_at': time.time(), 'results': results}, f, indent=2)
+
+    columns = ['case', 'pipeline', 'interpolator', 'width', 'height', 'frames', 'motion', 'gap',
+               'frames_per_sec', 'p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb', 'metrics_speedup']
+    csv_path = os.path.join(output_dir, "results.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for result in results:
+            latency = result.get('segment_latency_ms', {})
+            writer.writerow({**result, **{f"{k}_ms": v for k, v in latency.items()}})
+    logger.info(f"Wrote {json_path} and {csv_path}")
+
+
+def _parse_resolution(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Skip2Smooth pipelines on synthetic videos.")
+    parser.add_argument("--interpolator", choices=["stub", "real", "both"], default="stub")
+    parser.add_argument("--resolutions", nargs="+", type=_parse_resolution, default=[(320, 180), (640, 360)])
+    parser.add_argument("--lengths", nargs="+", type=int, default=[60, 240], help="Frames per synthetic video")
+    parser.add_argument("--motion", nargs="+", choices=sorted(MOTION_LEVELS), default=["low", "high"])
+    parser.add_argument("--gap", type=int, default=3, help="Dropped frames between keyframes")
+    parser.add_argument("--batch-size", default="8", help='Batch size, or "auto"')
+    parser.add_argument("--sender", action="store_true", help="Also benchmark KeyframeSelector (needs torch/lpips)")
+    parser.add_argument("--output-dir", default="bench_results")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS, help="Regression thresholds JSON")
+    args = parser.parse_args()
+
+    batch_size = args.batch_size if args.batch_size == "auto" else int(args.batch_size)
+    interpolators = {}
+    if args.interpolator in ("stub", "both"):
+        interpolators['stub'] = StubInterpolator()
+    if args.interpolator in ("real", "both"):
+        from pipeline.google_film.interpolater import get_interpolator
+        interpolators['real'] = get_interpolator()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="skip2smooth_bench_") as work_dir:
+        for (width, height), num_frames, motion in itertools.product(args.resolutions, args.lengths, args.motion):
+            for name, interpolator in interpolators.items():
+                case_dir = os.path.join(work_dir, f"{name}_{width}x{height}_{num_frames}_{motion}")
+                result = run_receiver_case(case_dir, name, interpolator, width, height, num_frames,
+                                           motion, args.gap, batch_size)
+                logger.info(f"{result['case']}: {result['frames_per_sec']:.1f} frames/sec, "
+                            f"p95 {result['segment_latency_ms']['p95']:.1f} ms, "
+                            f"peak {result['peak_rss_mb']:.0f} MB")
+                results.append(result)
+
+            if args.sender:
+                result = run_sender_case(os.path.join(work_dir, f"sender_{width}x{height}_{num_frames}_{motion}"),
+                                         width, height, num_frames, motion)
+                logger.info(f"{result['case']}: {result['frames_per_sec']:.1f} frames/sec, "
+                            f"metrics {result['metrics_speedup']:.1f}x faster than exhaustive")
+                results.append(result)
+
+    write_results(results, args.output_dir)
+
+    thresholds = {}
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+    failures = check_thresholds(results, thresholds)
+    for failure in failures:
+        logger.error(f"Regression: {failure}")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Import-time budget for the Streamlit pages.
+
+Each page module is imported in a fresh interpreter with `-X importtime`, and the
+slowest imports are reported. The run fails if a page exceeds its budget or pulls
+in a heavy dependency (TensorFlow, torch, ...) at load time; those must be
+imported only when the stage that needs them runs.
+
+Usage (from the repository root):
+    python -m benchmarks.startup_budget
+    python -m benchmarks.startup_budget --budget-ms 1500 --top 20
+"""
+import re
+import sys
+import time
+import argparse
+import logging
+import subprocess
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PAGES = ["homepage", "pages.send_video", "pages.receive_video"]
+
+# Top-level packages that must not be imported when a page loads
+HEAVY_MODULES = {"tensorflow", "tensorflow_hub", "torch", "torchvision", "lpips", "video_compressor", "mediapy"}
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_imports(module):
+    """
+    Imports `module` in a fresh interpreter and returns (wall seconds, rows), where
+    rows are (module name, self microseconds, cumulative microseconds, depth).
+    """
+    command = [sys.executable, "-X", "importtime", "-c", f"import {module}"]
+    start = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return wall_seconds, rows
+
+
+def report(module, wall_seconds, rows, top=10):
+    """
+    Logs the slowest imports for one module and returns the heavy modules it loaded.
+    """
+    total_ms = sum(row[1] for row in rows) / 1000
+    logger.info(f"{module}: {wall_seconds * 1000:.0f} ms wall, {total_ms:.0f} ms in imports ({len(rows)} modules)")
+    for name, self_us, cumulative_us, depth in sorted(rows, key=lambda row: row[2], reverse=True)[:top]:
+        logger.info(f"    {cumulative_us / 1000:8.1f} ms cumulative  {self_us / 1000:7.1f} ms self  {name}")
+    return sorted({row[0].split(".")[0] for row in rows} & HEAVY_MODULES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report per-module import time for the Streamlit pages.")
+    parser.add_argument("modules", nargs="*", default=PAGES, help="Modules to import (default: every page)")
+    parser.add_argument("--budget-ms", type=float, default=3000.0, help="Maximum wall time per page import")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list")
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules:
+        wall_seconds, rows = measure_imports(module)
+        heavy = report(module, wall_seconds, rows, args.top)
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)} at load time")
+        if wall_seconds * 1000 > args.budget_ms:
+            failures.append(f"{module} took {wall_seconds * 1000:.0f} ms > {args.budget_ms:.0f} ms budget")
+
+    for failure in failures:
+        logger.error(f"Startup budget exceeded: {failure}")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import time
+import numpy as np
+
+
+class StubInterpolator:
+    """
+    Deterministic stand-in for Interpolator that cross-fades the two frames.
+
+    Implements the same calls the pipeline makes, so reconstruction overhead
+    (decode, scheduling, conversion, encode) can be measured without TensorFlow,
+    a GPU or network access.
+    """
+
+    def __init__(self):
+        self._calls = 0
+        self._seconds = 0.0
+
+    def model_version(self, tile_size=None, tile_overlap=64):
+        return "stub-linear-blend"
+
+    def __call__(self, x0, x1, dt, tile_size=None, tile_overlap=64):
+        return self.interpolate_pairs(x0, x1, np.arange(len(dt)), dt)
+
+    def interpolate_pairs(self, frames0, frames1, pair_index, dt, batch_size=None, tile_size=None, tile_overlap=64):
+        start = time.perf_counter()
+        dt = np.asarray(dt, dtype=np.float32)[:, np.newaxis, np.newaxis, np.newaxis]
+        result = (1 - dt) * frames0[pair_index] + dt * frames1[pair_index]
+        self._calls += 1
+        self._seconds += time.perf_counter() - start
+        return result.astype(np.float32)
+
+    def interpolate_times(self, frame0, frame1, dt, batch_size=None, tile_size=None, tile_overlap=64):
+        pair_index = np.zeros(len(dt), dtype=np.int32)
+        return self.interpolate_pairs(frame0[np.newaxis], frame1[np.newaxis], pair_index, dt, batch_size)
+
+    def warmup(self, frame_shape, tile_size=None, tile_overlap=64):
+        pass
+
+    def latency_stats(self):
+        return {
+            'load_seconds': 0.0,
+            'cold_calls': 0,
+            'cold_mean_seconds': 0.0,
+            'warm_calls': self._calls,
+            'warm_mean_seconds': self._seconds / self._calls if self._calls else 0.0,
+        }
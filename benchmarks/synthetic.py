@@ -0,0 +1,74 @@
+import os
+import csv
+import cv2
+import numpy as np
+import mediapy as media
+
+MOTION_LEVELS = {
+    # pixels moved per frame, as a fraction of the frame width
+    'static': 0.0,
+    'low': 0.002,
+    'medium': 0.01,
+    'high': 0.04,
+}
+
+
+def generate_frames(width, height, num_frames, motion="medium", seed=0):
+    """
+    Yields deterministic RGB uint8 frames of shapes drifting over a textured background.
+    """
+    rng = np.random.default_rng(seed)
+    background = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    speed = MOTION_LEVELS[motion] * width
+    shapes = [
+        (rng.uniform(0, width), rng.uniform(0, height), rng.uniform(0.03, 0.1) * min(width, height),
+         rng.uniform(0, 2 * np.pi), tuple(int(c) for c in rng.integers(0, 256, 3)))
+        for _ in range(6)
+    ]
+    for t in range(num_frames):
+        frame = background.copy()
+        for x, y, radius, angle, color in shapes:
+            cx = int((x + np.cos(angle) * speed * t) % width)
+            cy = int((y + np.sin(angle) * speed * t) % height)
+            cv2.circle(frame, (cx, cy), int(radius), color, -1)
+        yield frame
+
+
+def write_keyframe_inputs(output_dir, width, height, num_frames, motion="medium", gap=3, fps=30):
+    """
+    Writes a synthetic keyframe video and its retained-indices CSV, as the sender would.
+
+    Every (gap + 1)-th frame is kept. Returns (video_path, indices_path, num_frames).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"{width}x{height}_{num_frames}f_{motion}_gap{gap}"
+    video_path = os.path.join(output_dir, f"{name}_keyframes.mp4")
+    indices_path = os.path.join(output_dir, f"{name}_retained_indices.csv")
+
+    indices = list(range(0, num_frames, gap + 1))
+    if indices[-1] != num_frames - 1:
+        indices.append(num_frames - 1)
+    kept = set(indices)
+
+    with media.VideoWriter(video_path, shape=(height, width), fps=fps) as writer:
+        for i, frame in enumerate(generate_frames(width, height, num_frames, motion)):
+            if i in kept:
+                writer.add_image(frame)
+
+    with open(indices_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Frame_Index"])
+        for idx in indices:
+            writer.writerow([idx])
+
+    return video_path, indices_path, num_frames
+
+
+def write_source_video(output_dir, width, height, num_frames, motion="medium", fps=30):
+    """
+    Writes a full-frame-rate synthetic video for sender benchmarks. Returns its path.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    video_path = os.path.join(output_dir, f"{width}x{height}_{num_frames}f_{motion}_source.mp4")
+    media.write_video(video_path, generate_frames(width, height, num_frames, motion), fps=fps)
+    return video_path
@@ -0,0 +1,259 @@
+"""Headless batch CLI for Skip2Smooth.
+
+Compress-and-send and receive-and-reconstruct run as a job queue with
+configurable concurrency, and every job is timed and reported.
+
+Usage (from the repository root):
+    python cli.py send videos/ extra_clip.mov --reduction 70 --jobs 2 --report send_report.json
+    python cli.py send videos/ --adapt-factor 1.5 --no-upload
+    python cli.py send long_upload.mp4 --metric-workers 8
+    python cli.py receive <identifier> <identifier> --output-dir reconstructed --report receive_report.json
+    python cli.py receive --ids-file identifiers.txt --workers 4
+    python cli.py receive output_videos/    # local keyframe videos with embedded indices
+"""
+import os
+import json
+import time
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pipeline.profiler import Profiler, activate
+from pipeline.sender import VIDEO_EXTENSIONS
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def expand_paths(items, extensions):
+    """
+    Expands directories into the files inside them with one of `extensions`.
+    Items that are not existing paths are returned unchanged (e.g. identifiers).
+    """
+    expanded = []
+    for item in items:
+        if os.path.isdir(item):
+            for name in sorted(os.listdir(item)):
+                if name.lower().endswith(extensions):
+                    expanded.append(os.path.join(item, name))
+        else:
+            expanded.append(item)
+    return expanded
+
+
+def run_jobs(items, job, concurrency):
+    """
+    Runs `job(item)` for every item on a pool of `concurrency` threads.
+    Returns one report per item, in input order. A failed job is reported, not raised.
+    """
+    def timed(item):
+        start = time.perf_counter()
+        report = {'job': item, 'status': "ok"}
+        try:
+            report.update(job(item))
+        except Exception as e:
+            logger.error(f"Job {item} failed: {e}")
+            report.update({'status': "failed", 'error': str(e)})
+        report['seconds'] = round(time.perf_counter() - start, 3)
+        logger.info(f"Job {item} {report['status']} in {report['seconds']:.1f}s")
+        return report
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        return list(executor.map(timed, items))
+
+
+def send_job(video_path, args, metrics_cache):
+    from pipeline.reduction_curve import ReductionCurve
+    from pipeline.sender import compress_video, load_selector
+
+    if not os.path.isfile(video_path):
+        raise FileNotFoundError(f"Video not found: {video_path}")
+
+    start = time.perf_counter()
+    metrics_report = None
+    if args.exact_metrics:
+        selector = load_selector(video_path)
+        selector.compute_metrics()
+    else:
+        from pipeline.metrics_engine import CascadedMetrics, compute_selector_metrics, load_cached_metrics
+        engine = CascadedMetrics(workers=args.metric_workers)
+        metrics = None
+        if metrics_cache is not None:
+            # A cache hit needs no LPIPS model
+            metrics, metrics_report = load_cached_metrics(video_path, metrics_cache, engine)
+        if metrics is not None:
+            selector = load_selector(video_path, metrics=metrics)
+        else:
+            selector = load_selector(video_path)
+            metrics_report = compute_selector_metrics(selector, engine=engine, cache=metrics_cache)
+    metrics_done = time.perf_counter()
+
+    if args.adapt_factor is not None:
+        params = {'abs_thres': None, 'delta_thres': None, 'adapt_factor': args.adapt_factor}
+    else:
+        params = ReductionCurve.from_selector(selector).for_reduction(args.reduction)
+
+    result = compress_video(selector, params, output_dir=args.output_dir, intra_only=args.intra_only)
+    compressed = time.perf_counter()
+
+    report = {
+        'identifier': result['identifier'],
+        'compressed_path': result['compressed_path'],
+        # One more frame than consecutive pairs, comparable with retained_frames
+        'frames': selector.frame_pairs + 1,
+        'retained_frames': result['retained_frames'],
+        'intra_only': result['intra_only'],
+        'orig_mb': round(result['orig_size'], 3),
+        'comp_mb': round(result['comp_size'], 3),
+        'reduction_percent': round(result['reduction'], 2),
+        'adapt_factor': params['adapt_factor'],
+        'metrics_seconds': round(metrics_done - start, 3),
+        'compress_seconds': round(compressed - metrics_done, 3),
+    }
+    if metrics_report is not None:
+        report['metrics_cached'] = metrics_report['cached']
+        if not metrics_report['cached']:
+            report['metrics_exact_fraction'] = round(metrics_report['exact_fraction'], 4)
+            report['metrics_estimated_speedup'] = round(metrics_report['estimated_speedup'], 2)
+
+    if not args.no_upload:
+        from db.uploader import upload_files
+
+        with open(result['compressed_path'], "rb") as video_file:
+            upload_files(identifier=result['identifier'], video_file=video_file,
+                         video_filename=result['compressed_name'])
+        report['upload_seconds'] = round(time.perf_counter() - compressed, 3)
+    return report
+
+
+def receive_job(source, args, transfer_cache, segment_cache):
+    from pipeline.receiver import reconstruct_files
+    from pipeline.triage import SegmentTriage
+
+    start = time.perf_counter()
+    if os.path.isfile(source):
+        # A local keyframe video with its indices embedded
+        video_path = indices_path = source
+        job_id = os.path.splitext(os.path.basename(source))[0]
+    else:
+        from db.retriever import retrieve_files
+
+        retrieved = retrieve_files(source, args.download_dir, cache=transfer_cache)
+        if not retrieved:
+            raise RuntimeError(f"Could not retrieve files for identifier {source}")
+        video_path, indices_path = retrieved['video_path'], retrieved['indices_path']
+        job_id = source
+    retrieved_at = time.perf_counter()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_path = os.path.join(args.output_dir, f"{job_id}.mp4")
+    profiler = Profiler(job_id=job_id)
+    with activate(profiler):
+        report = reconstruct_files(
+            video_path, indices_path, output_path,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            strategy=args.strategy,
+            tile_size=args.tile_size,
+            tile_overlap=args.tile_overlap,
+            cache=segment_cache,
+            triage=None if args.no_triage else SegmentTriage(),
+        )
+
+    report.update({
+        'input_mb': round(os.path.getsize(video_path) / 1024 ** 2, 3),
+        'output_mb': round(os.path.getsize(output_path) / 1024 ** 2, 3),
+        'retrieve_seconds': round(retrieved_at - start, 3),
+        'stages': profiler.summary(),
+    })
+    return report
+
+
+def write_report(reports, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({'created_at': time.time(), 'jobs': reports}, f, indent=2)
+    logger.info(f"Report written to {path}")
+
+
+def _batch_size(value):
+    return value if value == "auto" else int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch compress-and-send and receive-and-reconstruct.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    send = subparsers.add_parser("send", help="Select keyframes, compress and upload videos")
+    send.add_argument("videos", nargs="+", help="Video files or directories of videos")
+    target = send.add_mutually_exclusive_group()
+    target.add_argument("--reduction", type=float, default=50.0, help="Target size reduction in percent")
+    target.add_argument("--adapt-factor", type=float, help="Use this adapt factor instead of a target reduction")
+    send.add_argument("--output-dir", default="output_videos")
+    send.add_argument("--no-upload", action="store_true", help="Compress only")
+    send.add_argument("--exact-metrics", action="store_true",
+                      help="Compute LPIPS and full-size SSIM on every frame pair")
+    send.add_argument("--metric-workers", type=int, default=1, help="Worker processes per video for metrics")
+    send.add_argument("--metrics-cache", default="metrics_cache", help="Directory for the metrics cache")
+    send.add_argument("--no-metrics-cache", action="store_true")
+    send.add_argument("--intra-only", action="store_true",
+                      help="Make every keyframe independently decodable (random access, several times larger)")
+    send.add_argument("--jobs", type=int, default=1, help="Videos processed concurrently")
+    send.add_argument("--report", default="send_report.json")
+
+    receive = subparsers.add_parser("receive", help="Download and reconstruct transfers")
+    receive.add_argument("sources", nargs="*", help="Identifiers, keyframe videos, or directories of them")
+    receive.add_argument("--ids-file", help="File with one identifier per line")
+    receive.add_argument("--output-dir", default="reconstructed")
+    receive.add_argument("--download-dir", default="temp_downloads", help="Used with --no-transfer-cache")
+    receive.add_argument("--no-transfer-cache", action="store_true")
+    receive.add_argument("--segment-cache", help="Directory for the interpolated segment cache")
+    receive.add_argument("--strategy", choices=["linear", "recursive", "auto"], default="linear")
+    receive.add_argument("--batch-size", type=_batch_size, default="auto", help='Batch size, or "auto"')
+    receive.add_argument("--workers", type=int, default=1, help="Worker processes per job")
+    receive.add_argument("--tile-size", type=int, help="Enable tiled inference with this tile size")
+    receive.add_argument("--tile-overlap", type=int, default=64)
+    receive.add_argument("--no-triage", action="store_true",
+                         help="Send every segment to the model, including static and scene-cut ones")
+    receive.add_argument("--jobs", type=int, default=1, help="Transfers processed concurrently")
+    receive.add_argument("--report", default="receive_report.json")
+
+    args = parser.parse_args()
+
+    if args.command == "send":
+        metrics_cache = None
+        if not args.no_metrics_cache:
+            from pipeline.metrics_cache import MetricsCache
+            metrics_cache = MetricsCache(args.metrics_cache)
+
+        items = expand_paths(args.videos, VIDEO_EXTENSIONS)
+        reports = run_jobs(items, lambda item: send_job(item, args, metrics_cache), args.jobs)
+    else:
+        sources = list(args.sources)
+        if args.ids_file:
+            with open(args.ids_file) as f:
+                sources.extend(line.strip() for line in f if line.strip())
+        if not sources:
+            parser.error("receive needs identifiers, keyframe videos or --ids-file")
+
+        transfer_cache = segment_cache = None
+        if not args.no_transfer_cache:
+            from db.transfer_cache import TransferCache
+            transfer_cache = TransferCache("transfer_cache", max_bytes=2 * 1024 ** 3)
+        if args.segment_cache:
+            from pipeline.segment_cache import SegmentCache
+            segment_cache = SegmentCache(args.segment_cache, max_bytes=4 * 1024 ** 3)
+
+        items = expand_paths(sources, (".mp4",))
+        reports = run_jobs(items, lambda item: receive_job(item, args, transfer_cache, segment_cache), args.jobs)
+
+    write_report(reports, args.report)
+    failed = sum(report['status'] != "ok" for report in reports)
+    logger.info(f"{len(reports) - failed}/{len(reports)} jobs succeeded.")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
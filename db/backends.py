@@ -0,0 +1,218 @@
+import os
+import shutil
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from contextlib import closing
+from db.init import get_client  # also loads .env
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BUCKET = "peer_files"
+TABLE = "peer_files"
+COLUMNS = ("identifier", "video_name", "video_path", "indices_name", "indices_path", "uploaded_at",
+           "video_size", "video_sha256", "indices_size", "indices_sha256")
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class StorageBackend(ABC):
+    """
+    Object storage plus the peer_files metadata table.
+    """
+
+    @abstractmethod
+    def upload(self, file, path):
+        """
+        Stores a file object under `path` and returns its full storage path.
+        """
+
+    @abstractmethod
+    def download(self, path, f, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """
+        Streams the object at `path` into the open binary file `f`.
+        """
+
+    @abstractmethod
+    def insert_file_info(self, row):
+        """
+        Inserts a metadata row and returns its identifier.
+        """
+
+    @abstractmethod
+    def get_file_info(self, identifier):
+        """
+        Returns the metadata row for `identifier`, or None.
+        """
+
+
+class SupabaseBackend(StorageBackend):
+    """
+    Supabase storage and database. The client and HTTP session are created on first use.
+    """
+
+    signed_url_seconds = 300
+    download_timeout = (10, 60)  # connect, read (seconds)
+
+    def __init__(self):
+        self._http = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        return get_client()
+
+    @property
+    def http(self):
+        # Shared session so downloads reuse pooled HTTP connections across calls
+        with self._lock:
+            if self._http is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                self._http = requests.Session()
+                self._http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+                self._http.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+            return self._http
+
+    def upload(self, file, path):
+        response = (
+            self.client.storage
+            .from_(BUCKET)
+            .upload(
+                file=file,
+                path=path,
+                file_options={"cache-control": "3600", "upsert": "false"}
+            )
+        )
+        return response.full_path
+
+    def download(self, path, f, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        # A signed URL lets the object stream in chunks instead of arriving as one bytes object
+        signed = self.client.storage.from_(BUCKET).create_signed_url(path, self.signed_url_seconds)
+        url = signed.get("signedURL") or signed.get("signedUrl")
+        with self.http.get(url, stream=True, timeout=self.download_timeout) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+
+    def insert_file_info(self, row):
+        response = self.client.table(TABLE).insert(row).execute()
+        return response.data[0]["identifier"]
+
+    def get_file_info(self, identifier):
+        response = self.client.table(TABLE).select("*").eq("identifier", identifier).execute()
+        return response.data[0] if response.data else None
+
+
+class LocalBackend(StorageBackend):
+    """
+    Stores objects under `root/peer_files/` and metadata in `root/peer_files.db` (SQLite).
+
+    An offline stand-in for Supabase, for development, benchmarks and tests.
+    """
+
+    def __init__(self, root="local_storage"):
+        self.root = root
+        self.bucket_dir = os.path.join(root, BUCKET)
+        self.db_path = os.path.join(root, f"{TABLE}.db")
+        os.makedirs(self.bucket_dir, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+                "identifier TEXT PRIMARY KEY, video_name TEXT, video_path TEXT, "
+                "indices_name TEXT, indices_path TEXT, uploaded_at TEXT, "
+                "video_size INTEGER, video_sha256 TEXT, indices_size INTEGER, indices_sha256 TEXT)"
+            )
+            # Databases created before the integrity columns existed
+            existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({TABLE})")}
+            for column in ("video_size", "video_sha256", "indices_size", "indices_sha256"):
+                if column not in existing:
+                    kind = "INTEGER" if column.endswith("_size") else "TEXT"
+                    conn.execute(f"ALTER TABLE {TABLE} ADD COLUMN {column} {kind}")
+            conn.commit()
+
+    def _connect(self):
+        # One connection per call keeps the backend safe to use from worker threads
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _object_path(self, path):
+        full_path = os.path.abspath(os.path.join(self.bucket_dir, path))
+        if os.path.commonpath([full_path, os.path.abspath(self.bucket_dir)]) != os.path.abspath(self.bucket_dir):
+            raise ValueError(f"Invalid storage path: {path}")
+        return full_path
+
+    def upload(self, file, path):
+        destination = self._object_path(path)
+        if os.path.exists(destination):
+            raise FileExistsError(f"Object already exists: {path}")
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        with open(destination, "wb") as f:
+            shutil.copyfileobj(file, f, DOWNLOAD_CHUNK_SIZE)
+        return f"{BUCKET}/{path}"
+
+    def download(self, path, f, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        with open(self._object_path(path), "rb") as source:
+            shutil.copyfileobj(source, f, chunk_size)
+
+    def insert_file_info(self, row):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                f"INSERT INTO {TABLE} ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [row.get(column) for column in COLUMNS]
+            )
+            conn.commit()
+        return row["identifier"]
+
+    def get_file_info(self, identifier):
+        with closing(self._connect()) as conn:
+            result = conn.execute(f"SELECT * FROM {TABLE} WHERE identifier = ?", (identifier,)).fetchone()
+        return dict(result) if result else None
+
+
+BACKENDS = {
+    'supabase': SupabaseBackend,
+    'local': LocalBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name=None):
+    """
+    Builds the backend named by `name` or the STORAGE_BACKEND env var (default "supabase").
+    LocalBackend stores its data under LOCAL_STORAGE_DIR (default "local_storage").
+    """
+    name = (name or os.environ.get("STORAGE_BACKEND", "supabase")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend {name!r}; expected one of {sorted(BACKENDS)}")
+    if name == 'local':
+        return LocalBackend(os.environ.get("LOCAL_STORAGE_DIR", "local_storage"))
+    return BACKENDS[name]()
+
+
+def get_backend():
+    """
+    Returns the process-wide storage backend, creating it on first use.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+            logger.info(f"Using {type(_backend).__name__} for storage")
+        return _backend
+
+
+def set_backend(backend):
+    """
+    Replaces the process-wide backend, e.g. with a LocalBackend in benchmarks.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -1,10 +1,30 @@
 import os
+import threading
 from dotenv import load_dotenv
-from supabase import create_client, Client
 
 load_dotenv()
 
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_KEY")
+_client = None
+_client_lock = threading.Lock()
 
-supabase: Client = create_client(url, key)
\ No newline at end of file
+
+def get_client():
+    """
+    Returns the process-wide Supabase client, creating it on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from supabase import create_client
+
+            url: str = os.environ.get("SUPABASE_URL")
+            key: str = os.environ.get("SUPABASE_KEY")
+            _client = create_client(url, key)
+        return _client
+
+
+def __getattr__(name):
+    # `from db.init import supabase` still works, but only connects when first imported
+    if name == "supabase":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
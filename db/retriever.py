@@ -1,6 +1,9 @@
-from db.init import supabase
+from db.backends import DOWNLOAD_CHUNK_SIZE, get_backend
+from db.transfer_cache import file_digest
 import os
+import shutil
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logger
 logging.basicConfig(level=logging.INFO)
@@ -11,15 +14,9 @@ def get_file_info(identifier):
     Retrieves file metadata from the database for a given identifier.
     """
     try:
-        response = (
-            supabase
-            .table("peer_files")
-            .select("*")
-            .eq("identifier", identifier)
-            .execute()
-        )
-        if response.data:
-            return response.data[0]
+        file_info = get_backend().get_file_info(identifier)
+        if file_info:
+            return file_info
         else:
             logger.warning(f"No entry found for identifier: {identifier}")
             return None
@@ -27,29 +24,68 @@ def get_file_info(identifier):
         logger.error(f"Error retrieving file info: {e}")
         return None
 
-def download_file(bucket_path, local_destination):
+def download_file(bucket_path, local_destination, chunk_size=DOWNLOAD_CHUNK_SIZE):
     """
     Downloads a file from the 'peer_files' bucket to a local destination.
+
+    The object is streamed to disk in chunks, so memory use does not grow with the
+    file size.
     """
+    partial_path = f"{local_destination}.part"
     try:
-        with open(local_destination, 'wb') as f:
-            response = supabase.storage.from_("peer_files").download(bucket_path)
-            f.write(response)
+        with open(partial_path, 'wb') as f:
+            get_backend().download(bucket_path, f, chunk_size=chunk_size)
+        # Only complete downloads appear under the final name
+        os.replace(partial_path, local_destination)
         logger.info(f"Downloaded {bucket_path} to {local_destination}")
         return True
     except Exception as e:
         logger.error(f"Error downloading file {bucket_path}: {e}")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
         return False
 
-def retrieve_files(identifier, download_dir):
+def _verify_downloads(file_info, downloads):
+    """
+    Hashes downloaded files and checks them against the size and SHA-256 recorded at
+    upload, where present. Returns {name: (size, sha256)}, or None on a mismatch.
+    """
+    expected = {
+        file_info.get("video_name"): (file_info.get("video_size"), file_info.get("video_sha256")),
+        file_info.get("indices_name"): (file_info.get("indices_size"), file_info.get("indices_sha256")),
+    }
+    digests = {}
+    for name, local_path in downloads.items():
+        size, sha256 = file_digest(local_path)
+        expected_size, expected_sha256 = expected.get(name, (None, None))
+        if (expected_size is not None and size != expected_size) or \
+           (expected_sha256 is not None and sha256 != expected_sha256):
+            logger.error(f"Integrity check failed for {name}: got {size} bytes, sha256 {sha256}")
+            return None
+        digests[name] = (size, sha256)
+    return digests
+
+def retrieve_files(identifier, download_dir, cache=None):
     """
     Retrieves metadata and downloads the associated compressed video and indices file.
     Returns a dictionary with paths to the downloaded files, or None if failed.
+
+    With a TransferCache, a cached transfer is returned without contacting the
+    backend, and new downloads are verified and stored in the cache instead of
+    `download_dir`.
     """
+    if cache is not None:
+        cached = cache.get(identifier)
+        if cached:
+            logger.info(f"Transfer cache hit for identifier: {identifier}")
+            return cached
+
     file_info = get_file_info(identifier)
     if not file_info:
         return None
 
+    if cache is not None:
+        download_dir = cache.staging_dir()
     os.makedirs(download_dir, exist_ok=True)
 
     # Extract info (assuming schema matches uploader implementation)
@@ -67,20 +103,32 @@ def retrieve_files(identifier, download_dir):
     
     if not video_name or not indices_name:
          logger.error("Database entry missing filename information.")
+         if cache is not None:
+             shutil.rmtree(download_dir, ignore_errors=True)
          return None
 
     local_video_path = os.path.join(download_dir, video_name)
     local_indices_path = os.path.join(download_dir, indices_name)
 
-    # Download Video
-    if not download_file(video_name, local_video_path):
-        return None
+    # Download the video and indices concurrently, unless the indices are embedded in the video
+    downloads = {video_name: local_video_path}
+    if indices_name != video_name:
+        downloads[indices_name] = local_indices_path
 
-    # Download Indices
-    if not download_file(indices_name, local_indices_path):
+    with ThreadPoolExecutor(max_workers=len(downloads)) as executor:
+        results = list(executor.map(download_file, downloads.keys(), downloads.values()))
+    digests = None
+    if all(results):
+        digests = _verify_downloads(file_info, downloads)
+    if digests is None:
+        if cache is not None:
+            shutil.rmtree(download_dir, ignore_errors=True)
         return None
-        
-    return {
+
+    paths = {
         "video_path": local_video_path,
         "indices_path": local_indices_path
     }
+    if cache is not None:
+        return cache.put(identifier, download_dir, paths, digests)
+    return paths
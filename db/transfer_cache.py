@@ -0,0 +1,125 @@
+import os
+import json
+import shutil
+import logging
+import tempfile
+from pipeline.disk_cache import DiskCache, file_digest, hash_key
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+_STAGING_PREFIX = ".staging-"
+
+
+class TransferCache(DiskCache):
+    """
+    Size-bounded local cache of retrieved transfers, keyed by identifier.
+
+    Each entry is a directory holding the downloaded files and a manifest with
+    their sizes and SHA-256 digests. Hits refresh the manifest's modification
+    time, so eviction drops the least recently received transfers first.
+    """
+
+    def _path(self, identifier):
+        return os.path.join(self.cache_dir, hash_key(identifier))
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            if name.startswith(_STAGING_PREFIX) or not os.path.isdir(entry_dir):
+                continue
+            try:
+                mtime = os.stat(os.path.join(entry_dir, MANIFEST)).st_mtime
+                size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            entries.append((mtime, name, size))
+        return entries
+
+    def _remove(self, name):
+        shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    def get(self, identifier, verify_hash=False):
+        """
+        Returns {'video_path', 'indices_path'} for a cached transfer, or None on a miss.
+
+        File sizes are always checked against the manifest; `verify_hash` also
+        re-hashes the files. Entries that fail the check are dropped.
+        """
+        entry_dir = self._path(identifier)
+        manifest_path = os.path.join(entry_dir, MANIFEST)
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+        for name, expected in manifest['files'].items():
+            path = os.path.join(entry_dir, name)
+            try:
+                intact = os.path.getsize(path) == expected['size']
+                if intact and verify_hash:
+                    intact = file_digest(path)[1] == expected['sha256']
+            except OSError:
+                intact = False
+            if not intact:
+                logger.warning(f"Cached transfer {identifier} is corrupt, discarding it.")
+                self._remove(os.path.basename(entry_dir))
+                return None
+
+        os.utime(manifest_path)
+        return {role: os.path.join(entry_dir, name) for role, name in manifest['paths'].items()}
+
+    def staging_dir(self):
+        """
+        Returns a new directory inside the cache to download into before put().
+        """
+        return tempfile.mkdtemp(prefix=_STAGING_PREFIX, dir=self.cache_dir)
+
+    def put(self, identifier, staging_dir, paths, digests):
+        """
+        Moves downloaded files from `staging_dir` into the cache.
+
+        `paths` maps roles ('video_path', 'indices_path') to files in `staging_dir`,
+        and `digests` maps file names to (size, sha256). Returns the cached paths.
+        A transfer larger than the whole cache is still kept until the next put(),
+        so the caller always gets its files.
+        """
+        manifest = {
+            'identifier': identifier,
+            'paths': {role: os.path.basename(path) for role, path in paths.items()},
+            'files': {name: {'size': size, 'sha256': sha256} for name, (size, sha256) in digests.items()},
+        }
+        with open(os.path.join(staging_dir, MANIFEST), "w") as f:
+            json.dump(manifest, f)
+
+        entry_dir = self._path(identifier)
+        cached = self.get(identifier)
+        if cached is not None:
+            # Another session cached the same transfer first
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return cached
+        if os.path.exists(entry_dir):
+            # Entries are moved in with their manifest, so one without a valid
+            # manifest is left over from a crash or a partial eviction
+            logger.warning(f"Removing incomplete cache entry for {identifier}.")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        try:
+            os.replace(staging_dir, entry_dir)
+        except OSError:
+            # Another session cached the same transfer in the meantime
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return self.get(identifier)
+
+        size = sum(size for size, _ in digests.values())
+        if size > self.max_bytes:
+            logger.warning(f"Transfer {identifier} ({size / 1024 ** 2:.1f} MB) is larger than the cache limit; "
+                           f"it is kept only until the next transfer is cached.")
+        with self._lock:
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict(keep=os.path.basename(entry_dir))
+        return {role: os.path.join(entry_dir, os.path.basename(path)) for role, path in paths.items()}
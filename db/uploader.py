@@ -1,5 +1,7 @@
-from db.init import supabase
+from db.backends import get_backend
+from db.transfer_cache import file_digest
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, UTC
 import logging
 
@@ -7,67 +9,73 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def upload_files(identifier, video_file, video_filename, indices_file, indices_filename):
+def _upload(file, path):
+    """
+    Uploads one file object to the 'peer_files' bucket.
+    Returns its full storage path, size and SHA-256 so receivers can verify it.
+    """
+    size, sha256 = file_digest(file)
+    full_path = get_backend().upload(file, path)
+    logger.info(f"Uploaded successfully: {path}")
+    return full_path, size, sha256
+
+def upload_files(identifier, video_file, video_filename, indices_file=None, indices_filename=None):
     """
     Uploads compressed video and indices file to storage and creates a database entry.
+    When the indices are embedded in the video, pass no indices file and only one
+    object is uploaded; the database entry then points both names at the video.
+    The two uploads run concurrently on the client's shared connection pool.
     """
     try:
-        # Upload Video
-        video_response = (
-            supabase.storage
-            .from_("peer_files")
-            .upload(
-                file=video_file,
-                path=video_filename,
-                file_options={"cache-control": "3600", "upsert": "false"}
-            )
-        )
-        logger.info(f"Video uploaded successfully: {video_filename}")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            video_future = executor.submit(_upload, video_file, video_filename)
+            indices_future = None
+            if indices_file is not None:
+                indices_future = executor.submit(_upload, indices_file, indices_filename)
 
-        # Upload Indices
-        indices_response = (
-            supabase.storage
-            .from_("peer_files")
-            .upload(
-                file=indices_file,
-                path=indices_filename,
-                file_options={"cache-control": "3600", "upsert": "false"}
-            )
-        )
-        logger.info(f"Indices file uploaded successfully: {indices_filename}")
+            video_path, video_size, video_sha256 = video_future.result()
+            if indices_future is None:
+                indices_filename = video_filename
+                indices_path, indices_size, indices_sha256 = video_path, video_size, video_sha256
+            else:
+                indices_path, indices_size, indices_sha256 = indices_future.result()
 
         return insert_file_info(
             identifier=identifier,
             video_filename=video_filename,
-            video_path=video_response.full_path,
+            video_path=video_path,
             indices_filename=indices_filename,
-            indices_path=indices_response.full_path,
-            uploaded_at=datetime.now(UTC).isoformat()
+            indices_path=indices_path,
+            uploaded_at=datetime.now(UTC).isoformat(),
+            video_size=video_size,
+            video_sha256=video_sha256,
+            indices_size=indices_size,
+            indices_sha256=indices_sha256
         )
     except Exception as e:
         logger.error(f"Error during file upload: {e}")
         raise e
 
-def insert_file_info(identifier, video_filename, video_path, indices_filename, indices_path, uploaded_at):
+def insert_file_info(identifier, video_filename, video_path, indices_filename, indices_path, uploaded_at,
+                     video_size=None, video_sha256=None, indices_size=None, indices_sha256=None):
     """
     Inserts metadata for both uploaded files into the database.
     """
     try:
-        response = (
-            supabase
-            .table("peer_files")
-            .insert({
-                "identifier": identifier,
-                "video_name": video_filename,
-                "video_path": video_path,
-                "indices_name": indices_filename,
-                "indices_path": indices_path,
-                "uploaded_at": uploaded_at,
-            })
-            .execute()
-        )
+        returned_id = get_backend().insert_file_info({
+            "identifier": identifier,
+            "video_name": video_filename,
+            "video_path": video_path,
+            "indices_name": indices_filename,
+            "indices_path": indices_path,
+            "uploaded_at": uploaded_at,
+            "video_size": video_size,
+            "video_sha256": video_sha256,
+            "indices_size": indices_size,
+            "indices_sha256": indices_sha256,
+        })
         logger.info(f"Database entry created for identifier: {identifier}")
-        return response.data[0]["identifier"]
+        return returned_id
     except Exception as e:
         logger.error(f"Error inserting file info into database: {e}")
         raise e
\ No newline at end of file
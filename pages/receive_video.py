@@ -1,17 +1,17 @@
 import streamlit as st
-import cv2
-import numpy as np
 import os
-import tempfile
-import shutil
 import time
-import subprocess
-import mediapy as media
+import uuid
 import logging
 from pipeline.create_inputs import create_inputs
-from pipeline.google_film.interpolater import Interpolator
-from pipeline.image_loader import load_image
+from pipeline.disk_cache import hash_key
+from pipeline.jobs import get_job_manager
+from pipeline.profiler import Profiler, activate
+from pipeline.receiver import run_reconstruction
+from pipeline.segment_cache import SegmentCache
+from pipeline.triage import SegmentTriage
 from db.retriever import retrieve_files
+from db.transfer_cache import TransferCache
 
 # Configure logger
 logging.basicConfig(level=logging.INFO)
@@ -23,61 +23,159 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-def reconstruct_video(inputs, output_path, fps=30, progress_bar=None, status_text_elem=None):
-    batch_size = 1 # Keep low for safety on general hardware
-    interpolator = Interpolator()
-    final_frames_dir = "temp_reconstruction_frames"
-    
-    if os.path.exists(final_frames_dir):
-        shutil.rmtree(final_frames_dir)
-    os.makedirs(final_frames_dir, exist_ok=True)
+@st.cache_resource
+def load_segment_cache():
+    # Interpolated segments persist across reruns so interrupted jobs can resume
+    return SegmentCache("interpolation_cache", max_bytes=4 * 1024 ** 3)
 
-    final_frames = []
+@st.cache_resource
+def load_transfer_cache():
+    # Shared by all sessions, so repeated receives of an identifier are local reads
+    return TransferCache("transfer_cache", max_bytes=2 * 1024 ** 3)
 
-    logger.info("Starting interpolation...")
+def reconstruct_job(job, video_file_path, indices_file_path, output_path, workers=1,
+                    tile_size=None, tile_overlap=64, cache=None, **options):
+    """
+    Background job body: decodes the keyframes, reconstructs and profiles the video.
+    """
+    batch_size = "auto" # Sized from available memory, batches span segments
+    profiler = Profiler(job_id=os.path.splitext(os.path.basename(video_file_path))[0])
 
-    for i, input_data in enumerate(inputs):
-        times_to_interpolate = input_data['times_to_interpolate']
-        frame1 = load_image(input_data['frame1_path'])
-        frame2 = load_image(input_data['frame2_path'])
+    with activate(profiler):
+        job.update(0.0, "Preparing segments...")
+        logger.info(f"Video file: {video_file_path}")
+        logger.info(f"Indices file: {indices_file_path}")
+        frame_store, inputs, index = create_inputs(indices_file_path, video_file_path)
+        if frame_store is None:
+            raise FileNotFoundError(f"Retained indices not found: {indices_file_path}")
+        # Binary and embedded indices carry the source frame rate; legacy CSVs do not
+        fps = index['fps'] or 30
 
-        segment_frames = [frame1]
+        try:
+            # Frames are streamed to the encoder as they are produced.
+            # The model is loaded once per process, on the first in-process job.
+            job.update(0.0, f"Interpolating {len(inputs)} segments...")
+            frames_written = run_reconstruction(frame_store, inputs, output_path, fps=fps, workers=workers,
+                                                tile_size=tile_size, tile_overlap=tile_overlap,
+                                                batch_size=batch_size, cache=cache,
+                                                progress_callback=job.update, on_chunk=job.add_output, **options)
+        finally:
+            # Release decoded keyframes
+            if frame_store is not None:
+                frame_store.close()
 
-        if times_to_interpolate > 0:
-            dt_all = np.linspace(0, 1, num=times_to_interpolate + 2)[1:-1].astype(np.float32)
+    latency = None
+    if workers == 1:
+        from pipeline.google_film.interpolater import get_interpolator
+        latency = get_interpolator().latency_stats()
 
-            for b_start in range(0, len(dt_all), batch_size):
-                b_end = min(b_start + batch_size, len(dt_all))
-                dt_chunk = dt_all[b_start:b_end]
+    profile_path = profiler.to_json(os.path.join("profiles", f"{profiler.job_id}_{int(time.time())}.json"))
+    triage = options.get('triage')
+    return {
+        'output_path': output_path,
+        'frames_written': frames_written,
+        'triage': triage.report() if triage is not None else None,
+        'latency': latency,
+        'profiler': profiler,
+        'profile_path': profile_path,
+    }
 
-                current_batch_size = len(dt_chunk)
-                x0_batch = np.tile(frame1[np.newaxis, ...], (current_batch_size, 1, 1, 1))
-                x1_batch = np.tile(frame2[np.newaxis, ...], (current_batch_size, 1, 1, 1))
+def render_profile(profiler, profile_path):
+    import pandas as pd
 
-                mid_frames = interpolator(x0_batch, x1_batch, dt_chunk)
+    profile = profiler.to_dict()
+    with st.expander("Performance Profile"):
+        wall_col, rss_col = st.columns(2)
+        with wall_col:
+            st.metric("Wall Time", f"{profile['wall_seconds']:.1f} s")
+        with rss_col:
+            st.metric("Peak RSS", f"{profile['peak_rss_mb']:.0f} MB")
+        st.dataframe(pd.DataFrame(profile['stages']), hide_index=True)
+        st.caption(f"Saved to {profile_path}")
 
-                segment_frames.extend([mid_frames[j] for j in range(len(mid_frames))])
+def render_chunks(job_id, chunks):
+    """
+    Plays finished chunks of a progressive reconstruction while later ones are encoded.
+    The chosen chunk is kept in the session, so new chunks do not interrupt playback.
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return
+    state_key = f"chunk_choice:{job_id}"
+    select_key = f"chunk_select:{job_id}"
+    # Start at the beginning; afterwards stay on the chosen chunk
+    current = min(st.session_state.get(state_key, 0), len(chunks) - 1)
 
-            logger.info(f"Interpolated segment {i}: added {len(mid_frames)} frames.")
-        
-        if progress_bar:
-            progress_bar.progress(i / len(inputs))
+    def choose(index):
+        # Callbacks run before the widgets are rebuilt, so the selectbox can be reset here
+        st.session_state[state_key] = index
+        st.session_state.pop(select_key, None)
 
-        final_frames.extend(segment_frames)
+    ready_seconds = chunks[-1]['start_seconds'] + chunks[-1]['duration_seconds']
+    choice_column, next_column = st.columns([4, 1])
+    with choice_column:
+        st.selectbox(
+            "Playing chunk", options=range(len(chunks)), index=current, key=select_key,
+            format_func=lambda i: f"Chunk {i + 1}: {chunks[i]['start_seconds']:.1f}s - "
+                                  f"{chunks[i]['start_seconds'] + chunks[i]['duration_seconds']:.1f}s",
+            on_change=lambda: st.session_state.__setitem__(state_key, st.session_state[select_key])
+        )
+    with next_column:
+        # The first chunk not yet watched, once it is ready
+        st.button("Next chunk", disabled=current + 1 >= len(chunks), on_click=choose, args=(current + 1,))
+    st.caption(f"{len(chunks)} chunks ready ({ready_seconds:.1f}s)")
+    st.video(chunks[current]['path'])
 
-        if i == len(inputs) - 1:
-            final_frames.append(frame2)
+def session_id():
+    # Identifies this browser session as a holder of the shared jobs it waits on
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
 
-    if progress_bar:
-        progress_bar.empty()
-    if status_text_elem:
-        status_text_elem.text("Stitching video...")
-    
-    # Use ffmpeg to stitch
-    logger.info(f'Final video created with {len(final_frames)} frames')
-    media.write_video(output_path, final_frames, fps=30)
-    
-    shutil.rmtree(final_frames_dir)
+def render_job(job):
+    """
+    Shows a reconstruction job's state. While it runs, the page polls it once a second.
+    """
+    st.divider()
+    st.caption(f"Job {job.id}: {job.name}")
+
+    if not job.finished:
+        st.progress(job.progress, text=job.message)
+        render_chunks(job.id, job.outputs)
+        if st.button("Cancel", disabled=job.cancel_requested):
+            # Other sessions may be waiting on the same job; it only stops when all have cancelled
+            if not job.cancel(holder=session_id()):
+                st.session_state.pop('reconstruct_job', None)
+                st.info("Stopped following this reconstruction; it continues for other sessions waiting on it.")
+                return
+        if job.status == "queued":
+            st.info("Waiting for a free worker. You can leave this page and come back.")
+        time.sleep(1)
+        st.rerun()
+    elif job.status == "done":
+        result = job.result
+        st.success("Reconstruction Complete!")
+        st.video(result['output_path'])
+
+        latency = result['latency']
+        if latency:
+            st.caption(
+                f"Model load: {latency['load_seconds']:.1f}s | "
+                f"Cold inference: {latency['cold_mean_seconds']:.2f}s/call ({latency['cold_calls']} calls) | "
+                f"Warm inference: {latency['warm_mean_seconds']:.2f}s/call ({latency['warm_calls']} calls)"
+            )
+        triage = result['triage']
+        if triage:
+            st.caption(
+                "Segment triage: " + " | ".join(
+                    f"{route} {percent:.0f}%" for route, percent in triage['percent'].items()
+                ) + f" of {triage['segments']} segments"
+            )
+        render_profile(result['profiler'], result['profile_path'])
+    elif job.status == "cancelled":
+        st.warning("Reconstruction cancelled.")
+    else:
+        st.error(f"Error during reconstruction: {job.message}")
 
 def main():
     st.title("Receiver")
@@ -93,7 +191,7 @@ def main():
     if st.button("Retrieve Files", type="primary"):
         if identifier_input:
             with st.spinner("Retrieving files from server..."):
-                retrieved = retrieve_files(identifier_input.strip(), temp_download_dir)
+                retrieved = retrieve_files(identifier_input.strip(), temp_download_dir, cache=load_transfer_cache())
                 if retrieved:
                     st.session_state['retrieved_video'] = retrieved['video_path']
                     st.session_state['retrieved_indices'] = retrieved['indices_path']
@@ -111,34 +209,57 @@ def main():
     if video_file_path and indices_file_path:
          st.success("Files ready. Starting reconstruction setup...")
          
+         strategy = st.selectbox(
+             "Interpolation Strategy",
+             options=["linear", "recursive", "auto"],
+             help="Linear interpolates each missing frame directly; recursive bisects large gaps; auto recurses only for large gaps"
+         )
+
+         with st.expander("High-resolution settings"):
+             use_tiles = st.checkbox("Tiled inference", help="Split large frames into overlapping tiles to bound memory")
+             tile_size = st.number_input("Tile size (px)", min_value=128, max_value=2048, value=512, step=64, disabled=not use_tiles)
+             tile_overlap = st.number_input("Tile overlap (px)", min_value=0, max_value=112, value=64, step=16, disabled=not use_tiles)
+             if not use_tiles:
+                 tile_size = None
+
+         progressive = st.checkbox(
+             "Progressive playback", value=True,
+             help="Write playable chunks as segments finish, so viewing starts before reconstruction ends"
+         )
+         chunk_seconds = 2.0 if progressive else None
+
+         use_triage = st.checkbox(
+             "Segment triage", value=True,
+             help="Fill static and near-static gaps by duplication or blending and hold frames across scene cuts; only moving segments use the model"
+         )
+
+         with st.expander("Parallel settings"):
+             workers = st.number_input(
+                 "Worker processes", min_value=1, max_value=os.cpu_count() or 1, value=1,
+                 help="Each worker loads its own model and reconstructs a shard of segments"
+             )
+
          if st.button("✨ Reconstruct Video", type="primary"):
-             temp_dir = "temp_frames_receiver"
-             output_video_path = "reconstructed_video.mp4"
-             
-             with st.spinner("Preparing segments..."):
-                 logger.info(f"Video file: {video_file_path}")
-                 logger.info(f"Indices file: {indices_file_path}")
-                 logger.info(f"Temp dir: {temp_dir}")
-                 inputs = create_inputs(indices_file_path, video_file_path, temp_dir)
-                 
-             st.info(f"Interpolating {len(inputs)} segments...")
-             progress_bar = st.progress(0)
-             status_text_elem = st.empty()
-             
+             name = os.path.splitext(os.path.basename(video_file_path))[0]
+             # Identical requests from any session share one job and one output file
+             key = f"reconstruct:{name}:{strategy}:{workers}:{tile_size}:{tile_overlap}:{chunk_seconds}:{use_triage}"
+             output_video_path = os.path.join("reconstructed", f"{hash_key(key)[:16]}.mp4")
+             os.makedirs("reconstructed", exist_ok=True)
              try:
-                 reconstruct_video(inputs, output_video_path, progress_bar=progress_bar, status_text_elem=status_text_elem)
-                 st.success("Reconstruction Complete!")
-                 st.video(output_video_path)
-                 
-                 # Cleanup temp reconstruction frames
-                 if os.path.exists(temp_dir):
-                     shutil.rmtree(temp_dir)
-             except Exception as e:
-                 st.error(f"Error during reconstruction: {str(e)}")
-                 logger.error(f"Error during reconstruction: {str(e)}")
-
-             # Cleanup downloaded files if in retrieval mode (optional, maybe user wants to keep them for a bit)
-             # For now, let's leave them in temp_downloads until next run or OS cleanup.
+                 job = get_job_manager().submit(
+                     f"Reconstruct {name}", reconstruct_job, video_file_path, indices_file_path, output_video_path,
+                     key=key, holder=session_id(), workers=workers, tile_size=tile_size, tile_overlap=tile_overlap,
+                     cache=load_segment_cache(), strategy=strategy, chunk_seconds=chunk_seconds,
+                     triage=SegmentTriage() if use_triage else None
+                 )
+                 st.session_state['reconstruct_job'] = job.id
+             except RuntimeError as e:
+                 st.error(str(e))
+
+    job_id = st.session_state.get('reconstruct_job')
+    job = get_job_manager().get(job_id) if job_id else None
+    if job is not None:
+        render_job(job)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,15 +1,15 @@
 import streamlit as st
-import cv2
-import numpy as np
 import os
 import tempfile
-import shutil
-import pandas as pd
 import uuid
+import time
 import logging
-from pipeline.create_inputs import create_inputs
-from video_compressor import KeyframeSelector
 from db.uploader import upload_files
+from pipeline.jobs import get_job_manager
+from pipeline.metrics_cache import MetricsCache
+from pipeline.metrics_engine import CascadedMetrics, compute_selector_metrics, load_cached_metrics
+from pipeline.reduction_curve import ReductionCurve
+from pipeline.sender import compress_video, load_selector
 
 # Configure logger
 logging.basicConfig(level=logging.INFO)
@@ -22,6 +22,68 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource
+def load_metrics_cache():
+    # Shared by all sessions, so a video analysed once skips straight to compression settings
+    return MetricsCache("metrics_cache", max_bytes=256 * 1024 ** 2)
+
+def metrics_job(job, video_path, workers=1, cache=None):
+    """
+    Background job body: reads the frame metrics from `cache`, or loads the
+    selector and computes them, split across `workers` processes.
+    Returns (metrics, selector or None on a cache hit, curve, report).
+    """
+    engine = CascadedMetrics(workers=workers)
+    if cache is not None:
+        # A hit needs neither the selector nor its LPIPS model; compression builds one later
+        metrics, metrics_report = load_cached_metrics(video_path, cache, engine)
+        if metrics is not None:
+            return metrics, None, ReductionCurve(metrics[:, 3]), metrics_report
+
+    job.update(0.0, "Loading LPIPS model...")
+    selector = load_selector(video_path)
+    logger.info("Starting metric computation...")
+    # Exact LPIPS only where it can change which frames are kept
+    metrics_report = compute_selector_metrics(selector, callback=job.update, engine=engine, cache=cache)
+    reduction_curve = ReductionCurve.from_selector(selector)
+    logger.info("Metric computation completed.")
+    return selector.metrics, selector, reduction_curve, metrics_report
+
+def compress_job(job, video_path, metrics, selector, params, identifier, intra_only):
+    """
+    Background job body: compresses the video, first building a selector without
+    an LPIPS model if the metrics came from the cache.
+    """
+    if selector is None:
+        job.update(0.0, "Preparing keyframe selection...")
+        selector = load_selector(video_path, metrics=metrics)
+    return compress_video(selector, params, identifier=identifier, progress_callback=job.update,
+                          intra_only=intra_only)
+
+def current_job(state_key):
+    job_id = st.session_state.get(state_key)
+    return get_job_manager().get(job_id) if job_id else None
+
+def poll_job(job):
+    """
+    Shows a running job's progress and polls it once a second.
+    """
+    st.progress(job.progress, text=job.message)
+    if st.button("Cancel", disabled=job.cancel_requested):
+        job.cancel()
+    if job.status == "queued":
+        st.info("Waiting for a free worker. You can leave this page and come back.")
+    time.sleep(1)
+    st.rerun()
+
+def show_job_outcome(job):
+    if job is None:
+        return
+    if job.status == "cancelled":
+        st.warning(f"{job.name} cancelled.")
+    elif job.status == "failed":
+        st.error(f"{job.name} failed: {job.message}")
+
 def main():
     st.title("Skip2Smooth")
     st.subheader("Send Video to the Peer")
@@ -41,19 +103,19 @@ def main():
         st.session_state.metrics_computed = False
     if 'compress_ready' not in st.session_state:
         st.session_state.compress_ready = False
-    if 'reductions' not in st.session_state:
-        st.session_state.reductions = []
+    if 'reduction_curve' not in st.session_state:
+        st.session_state.reduction_curve = None
     if 'compressed_path' not in st.session_state:
         st.session_state.compressed_path = None
-    if 'indices_path' not in st.session_state:
-        st.session_state.indices_path = None
 
     if uploaded_file is not None:
         if 'video_path' not in st.session_state or st.session_state.uploaded_file_name != uploaded_file.name:
             # Create temp file with descriptive name
             temp_video_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
             temp_video_file.write(uploaded_file.read())
+            temp_video_file.close()
             st.session_state.video_path = temp_video_file.name
+            st.session_state.metrics_key = load_metrics_cache().metrics_key(temp_video_file.name, *CascadedMetrics().config())
             st.session_state.uploaded_file_name = uploaded_file.name
             st.session_state.compressed_file_name = None
             logger.info(f"Video uploaded: {uploaded_file.name}, saved to {temp_video_file.name}")
@@ -62,7 +124,9 @@ def main():
             st.session_state.metrics_computed = False
             st.session_state.compress_ready = False
             st.session_state.inputs_created = False
-            st.session_state.reductions = []
+            st.session_state.reduction_curve = None
+            for key in ('metrics', 'selector', 'metrics_report', 'metrics_job', 'compress_job'):
+                st.session_state.pop(key, None)
         
         video_path = st.session_state.video_path
         
@@ -71,134 +135,120 @@ def main():
             st.video(video_path)
             st.caption("Original Video")
 
-        if 'selector' not in st.session_state:
-            st.session_state.selector = KeyframeSelector(video_path, verbose=False)
-            
-        selector = st.session_state.selector
-
         st.divider()
         st.header("Analysis")
         
         if not st.session_state.metrics_computed:
-            if st.button("Compute Metrics", type="primary"):
-                def make_callback(progress_bar, status_text_elem):
-                    def callback(p, msg):
-                        progress_bar.progress(p)
-                        status_text_elem.text(msg)
-                    return callback
-
-                progress_bar = st.progress(0, text="Computing metrics (LPIPS, SSIM, MSE)")
-                status_text_elem = st.empty()
-                
-                with st.spinner("Computing metrics (LPIPS, SSIM, MSE)..."):
-                    logger.info("Starting metric computation...")
-                    selector.compute_metrics(callback=make_callback(progress_bar, status_text_elem))
-                    st.session_state.reductions = selector.set_reductions(n=200)
-                    logger.info("Metric computation completed.")
-                
-                progress_bar.empty()
-                status_text_elem.empty()
+            job = current_job('metrics_job')
+            if job is not None and job.status == "done":
+                (st.session_state.metrics, st.session_state.selector,
+                 st.session_state.reduction_curve, st.session_state.metrics_report) = job.result
                 st.session_state.metrics_computed = True
                 st.rerun()
+            elif job is not None and not job.finished:
+                poll_job(job)
+            elif job is None and load_metrics_cache().contains(st.session_state.metrics_key):
+                # Analysed before: load the cached metrics without waiting for a click
+                try:
+                    job = get_job_manager().submit("Load cached metrics", metrics_job, video_path,
+                                                   key=f"metrics:{video_path}", cache=load_metrics_cache())
+                    st.session_state.metrics_job = job.id
+                    st.rerun()
+                except RuntimeError as e:
+                    st.error(str(e))
+            else:
+                show_job_outcome(job)
+                with st.expander("Parallel settings"):
+                    workers = st.number_input(
+                        "Metric worker processes", min_value=1, max_value=os.cpu_count() or 1,
+                        value=min(4, os.cpu_count() or 1),
+                        help="Frame ranges are decoded and scored in parallel, each worker with its own LPIPS model"
+                    )
+                if st.button("Compute Metrics", type="primary"):
+                    try:
+                        job = get_job_manager().submit("Compute metrics", metrics_job, video_path,
+                                                       key=f"metrics:{video_path}", workers=workers,
+                                                       cache=load_metrics_cache())
+                        st.session_state.metrics_job = job.id
+                        st.rerun()
+                    except RuntimeError as e:
+                        st.error(str(e))
 
         if st.session_state.metrics_computed:
+            import pandas as pd
+
             st.text("Difference between consecutive frames")
-            metrics_dataframe = pd.DataFrame(selector.metrics, columns=["MSE", "Inv SSIM", "LPIPS", "Difference"])
+            metrics_dataframe = pd.DataFrame(st.session_state.metrics, columns=["MSE", "Inv SSIM", "LPIPS", "Difference"])
             st.line_chart(metrics_dataframe[["Difference"]], height=200)
+            metrics_report = st.session_state.metrics_report
+            if metrics_report['cached']:
+                st.caption("Loaded from the metrics cache: this video was analysed before")
+            else:
+                st.caption(
+                    f"Computed in {metrics_report['seconds']:.1f}s, exact LPIPS on "
+                    f"{100 * metrics_report['exact_fraction']:.0f}% of frame pairs "
+                    f"(~{metrics_report['estimated_speedup']:.1f}x faster than exhaustive)"
+                )
             
             st.header("Compression Settings")
             
-            reductions = st.session_state.reductions
-            min_reduction = min(r['reduction_percent'] for r in reductions)
-            max_reduction = max(r['reduction_percent'] for r in reductions)
+            # Every slider position is a binary search over the precomputed curve
+            reduction_curve = st.session_state.reduction_curve
+            min_reduction = reduction_curve.min_reduction
+            max_reduction = reduction_curve.max_reduction
             
             target_reduction = st.slider(
                 "Target Size Reduction (%)", 
                 min_value=min_reduction, 
                 max_value=max_reduction, 
                 value=(min_reduction + max_reduction)/2,
+                step=0.1,
                 format="%.1f%%"
             )
             
-            best_match = min(reductions, key=lambda x: abs(x['reduction_percent'] - target_reduction))
+            best_match = reduction_curve.for_reduction(target_reduction)
             
-            st.info(f"Paramters: Abs={best_match['abs_thres']:.2f}, Delta={best_match['delta_thres']:.2f}, Adapt={best_match['adapt_factor']:.2f}")
-
-            if st.button("Compress Video", type="primary"):
-                def make_callback(progress_bar, status_text_elem):
-                    def callback(p, msg):
-                        progress_bar.progress(p)
-                        status_text_elem.text(msg)
-                    return callback
-                
-                progress_bar = st.progress(0, text="Selecting keyframes and compressing video")
-                status_text_elem = st.empty()
-                
-                # Generate unique identifier for this compression job
-                identifier = str(uuid.uuid4())
-                st.session_state.identifier = identifier
-                logger.info(f"Started compression job with identifier: {identifier}")
-
-                with st.spinner("Selecting keyframes and compressing..."):
-                    selector.select_keyframes(
-                        abs_thres=best_match['abs_thres'],
-                        delta_thres=best_match['delta_thres'],
-                        adapt_factor=best_match['adapt_factor']
-                    )
-                    
-                    selector.create_retained_indices_file()
-                    selector.create_compressed_video(callback=make_callback(progress_bar, status_text_elem))
-                    
-                    progress_bar.empty()
-                    status_text_elem.empty()
-                    
-                    # Rename files to match identifier
-                    original_compressed_path = selector.output_video
-                    # Assuming default naming convention from KeyframeSelector, we'll need to robustly find it if possible
-                    # but since we can't see KeyframeSelector code, we rely on selector.output_video being correct.
-                    
-                    # Construct expected indices path based on previous code logic
-                    video_name_no_ext = os.path.splitext(os.path.basename(video_path))[0]
-                    original_indices_path = os.path.join(selector.metrics_dir, f"{video_name_no_ext}_retained_indices.csv")
-                    
-                    new_compressed_name = f"{identifier}.mp4"
-                    new_indices_name = f"{identifier}_indices.csv"
-                    
-                    new_compressed_path = os.path.join(os.path.dirname(original_compressed_path), new_compressed_name)
-                    new_indices_path = os.path.join(os.path.dirname(original_indices_path), new_indices_name)
-                    
-                    # Rename
+            st.info(f"Paramters: Abs={best_match['abs_thres']:.2f}, Delta={best_match['delta_thres']:.2f}, Adapt={best_match['adapt_factor']:.2f} "
+                    f"({best_match['reduction_percent']:.1f}% of frames dropped)")
+
+            job = current_job('compress_job')
+            if job is not None and job.status == "done" and not st.session_state.processed:
+                result = job.result
+                st.session_state.identifier = result['identifier']
+                st.session_state.compressed_path = result['compressed_path']
+                st.session_state.compressed_file_name = result['compressed_name']
+                st.session_state.orig_size = result['orig_size']
+                st.session_state.comp_size = result['comp_size']
+                st.session_state.reduction = result['reduction']
+                st.session_state.processed = True
+                logger.info("Compression and processing completed.")
+                st.rerun()
+            elif job is not None and not job.finished:
+                poll_job(job)
+            else:
+                if job is None or job.status != "done":
+                    show_job_outcome(job)
+                intra_only = st.checkbox(
+                    "Random-access keyframes", value=False,
+                    help="Encode every keyframe independently, so the receiver can decode any segment "
+                         "directly and start parallel workers at once. The keyframe video is several "
+                         "times larger."
+                )
+                if st.button("Compress Video", type="primary"):
+                    # Generate unique identifier for this compression job
+                    identifier = str(uuid.uuid4())
+                    logger.info(f"Started compression job with identifier: {identifier}")
+                    st.session_state.processed = False
                     try:
-                        os.rename(original_compressed_path, new_compressed_path)
-                        logger.info(f"Renamed compressed video to {new_compressed_path}")
-                    except OSError as e:
-                        logger.error(f"Failed to rename compressed video: {e}")
-
-                    if os.path.exists(original_indices_path):
-                        try:
-                            os.rename(original_indices_path, new_indices_path)
-                            logger.info(f"Renamed indices file to {new_indices_path}")
-                        except OSError as e:
-                            logger.error(f"Failed to rename indices file: {e}")
-                    else:
-                        logger.warning(f"Indices file not found at {original_indices_path}")
-
-                    st.session_state.compressed_path = new_compressed_path
-                    st.session_state.compressed_file_name = new_compressed_name
-                    st.session_state.indices_path = new_indices_path
-                    st.session_state.indices_file_name = new_indices_name
-                    
-                    # Update selector path so get_sizes works if it checks the file
-                    selector.output_video = new_compressed_path 
-                    
-                    orig_size, comp_size = selector.get_sizes()
-
-                    st.session_state.orig_size = orig_size
-                    st.session_state.comp_size = comp_size
-                    st.session_state.reduction = (1 - (comp_size / orig_size)) * 100
-                    st.session_state.processed = True
-                    logger.info("Compression and processing completed.")
-                    st.rerun()
+                        job = get_job_manager().submit(
+                            "Compress video", compress_job, video_path, st.session_state.metrics,
+                            st.session_state.selector, best_match, identifier, intra_only,
+                            key=f"compress:{video_path}:{intra_only}"
+                        )
+                        st.session_state.compress_job = job.id
+                        st.rerun()
+                    except RuntimeError as e:
+                        st.error(str(e))
 
         if st.session_state.processed:
             metric_col1, metric_col2, metric_col3 = st.columns(3)
@@ -224,15 +274,11 @@ def main():
                 with st.spinner("Sending"):
                     logger.info(f"Uploading files for identifier {identifier}")
                     try:
-                        with open(st.session_state.compressed_path, "rb") as video_file, \
-                             open(st.session_state.indices_path, "rb") as indices_file:
-                            
+                        with open(st.session_state.compressed_path, "rb") as video_file:
                             returned_id = upload_files(
                                 identifier=identifier,
                                 video_file=video_file,
-                                video_filename=st.session_state.compressed_file_name,
-                                indices_file=indices_file,
-                                indices_filename=st.session_state.indices_file_name
+                                video_filename=st.session_state.compressed_file_name
                             )
                         st.success("Files Sent Successfully - Copy the below string to send to peers")
                         st.info(returned_id)
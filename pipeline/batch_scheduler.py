@@ -0,0 +1,132 @@
+import os
+import logging
+from collections import deque
+import numpy as np
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def available_memory_bytes():
+    """
+    Returns the currently available physical memory in bytes, or None if unknown.
+    """
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def auto_batch_size(frame_shape, align=64, bytes_per_pixel=400, memory_fraction=0.25, max_batch_size=32):
+    """
+    Picks a batch size so one inference call fits in a fraction of the free memory.
+
+    `bytes_per_pixel` is a rough estimate of the FILM working set (inputs, feature
+    pyramids, flows and output) per padded pixel of one batch item.
+    """
+    available = available_memory_bytes()
+    if available is None:
+        logger.warning("Could not determine available memory, using batch size 1.")
+        return 1
+
+    height, width = frame_shape[:2]
+    padded_height = -(-height // align) * align
+    padded_width = -(-width // align) * align
+    per_item = padded_height * padded_width * bytes_per_pixel
+
+    batch_size = int(available * memory_fraction // per_item)
+    batch_size = max(1, min(batch_size, max_batch_size))
+    logger.info(f"Auto-tuned batch size to {batch_size} for {width}x{height} frames.")
+    return batch_size
+
+
+class _Segment:
+    def __init__(self, frame1, frame2, dt):
+        self.frame1 = frame1
+        self.frame2 = frame2
+        self.dt = dt
+        self.results = [None] * len(dt)
+        self.remaining = len(dt)
+
+
+class BatchScheduler:
+    """
+    Packs (frame1, frame2, dt) work items from many segments into full batches.
+
+    Segments are consumed lazily and their interpolated frames are returned in
+    input order, so small gaps from neighbouring segments share one inference
+    call instead of each running their own.
+
+    Usage:
+        scheduler = BatchScheduler(interpolator, batch_size=8)
+        for frame1, frame2, mid_frames in scheduler.run(segments):
+            ...
+        Where segments is an iterable of (frame1, frame2, dt) tuples.
+    """
+
+    def __init__(self, interpolator, batch_size=8, max_pending_segments=64, tile_size=None, tile_overlap=64):
+        self.interpolator = interpolator
+        self.batch_size = batch_size
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.max_pending_segments = max_pending_segments
+        self.batches_run = 0
+        self.items_run = 0
+
+    def _run_batch(self, work):
+        items = [work.popleft() for _ in range(min(self.batch_size, len(work)))]
+
+        # Each distinct keyframe pair is sent once and shared by its items
+        segments = {}
+        for segment, _ in items:
+            segments.setdefault(id(segment), (len(segments), segment))
+        frames0 = np.stack([segment.frame1 for _, segment in segments.values()])
+        frames1 = np.stack([segment.frame2 for _, segment in segments.values()])
+        pair_index = np.array([segments[id(segment)][0] for segment, _ in items], dtype=np.int32)
+        dt = np.array([segment.dt[j] for segment, j in items], dtype=np.float32)
+
+        mid_frames = self.interpolator.interpolate_pairs(frames0, frames1, pair_index, dt,
+                                                         tile_size=self.tile_size, tile_overlap=self.tile_overlap)
+
+        for (segment, j), frame in zip(items, mid_frames):
+            segment.results[j] = frame
+            segment.remaining -= 1
+        self.batches_run += 1
+        self.items_run += len(items)
+
+    @staticmethod
+    def _finish(segment):
+        return segment.frame1, segment.frame2, segment.results
+
+    def run(self, segments):
+        """
+        Yields (frame1, frame2, interpolated frames) for each segment, in input order.
+        """
+        pending = deque()
+        work = deque()
+
+        for frame1, frame2, dt in segments:
+            segment = _Segment(frame1, frame2, dt)
+            pending.append(segment)
+            work.extend((segment, j) for j in range(len(dt)))
+
+            while len(work) >= self.batch_size:
+                self._run_batch(work)
+
+            # A partial batch holds back the segments queued behind it; flush it
+            # before too many keyframes pile up in memory.
+            if len(pending) > self.max_pending_segments and pending[0].remaining:
+                self._run_batch(work)
+
+            while pending and not pending[0].remaining:
+                yield self._finish(pending.popleft())
+
+        while work:
+            self._run_batch(work)
+        while pending:
+            yield self._finish(pending.popleft())
+
+        if self.batches_run:
+            logger.info(f"Ran {self.items_run} interpolations in {self.batches_run} batches "
+                        f"(mean batch size {self.items_run / self.batches_run:.1f}).")
@@ -1,68 +1,64 @@
-import cv2
 import os
-import csv
-import shutil
 import logging
+from pipeline.frame_store import FrameStore, LazyFrameStore
+from pipeline.indices_format import load_retained_indices
+from pipeline.keyframe_container import random_access_frame_count
+from pipeline.profiler import profile_stage
 
 # Configure logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def create_inputs(retained_indices_path, compressed_video_path, temp_dir):
-    if os.path.exists(temp_dir):
-        shutil.rmtree(temp_dir)
-    os.makedirs(temp_dir)
+def create_inputs(retained_indices_path, compressed_video_path, mmap_path=None, random_access=True):
+    """
+    Decodes the keyframe video into a FrameStore and pairs consecutive keyframes.
+    Returns the store, a list of segments that reference frames by index, and
+    the parsed index (see load_retained_indices) for its fps and dimensions.
+    Returns (None, [], None) if the index file does not exist.
 
-    logger.info(f"Extracting frames from {compressed_video_path}...")
-    cap = cv2.VideoCapture(compressed_video_path)
-    frame_paths = []
-    frame_count = 0
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # Save frame
-        file_path = os.path.join(temp_dir, f"frame_{frame_count:04d}.png")
-        cv2.imwrite(file_path, frame)
-        frame_paths.append(file_path)
-        frame_count += 1
-
-    cap.release()
-    logger.info(f"Extracted {len(frame_paths)} frames.")
-
-    indices = []
+    `retained_indices_path` may be a binary index, a legacy CSV, or the keyframe
+    video itself when the index is embedded in it. An intra-only keyframe video
+    with a frame index is opened as a LazyFrameStore instead, which decodes
+    keyframes as segments need them, unless `random_access` is False or
+    `mmap_path` asks for a decoded store.
+    """
     if os.path.exists(retained_indices_path):
-        with open(retained_indices_path, 'r') as f:
-            f.seek(0)
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['Frame_Index']:
-                    indices.append(int(row['Frame_Index']))
+        index = load_retained_indices(retained_indices_path)
+        indices = index['indices'].tolist()
     else:
         logger.error(f"Error: {retained_indices_path} not found.")
-        return []
+        return None, [], None
 
     logger.info(f"Loaded {len(indices)} indices.")
 
-    if len(indices) != len(frame_paths):
-        logger.warning(f"WARNING: Mismatch between indices count ({len(indices)}) and extracted frames ({len(frame_paths)}).")
+    frame_count = random_access_frame_count(compressed_video_path) if random_access and mmap_path is None else None
+    if frame_count is not None:
+        logger.info(f"Opening intra-only {compressed_video_path} for random access ({frame_count} frames).")
+        frame_store = LazyFrameStore(compressed_video_path, frame_count)
+    else:
+        logger.info(f"Extracting frames from {compressed_video_path}...")
+        with profile_stage("decode") as stage:
+            frame_store = FrameStore.from_video(compressed_video_path, mmap_path=mmap_path)
+            stage['frames'] = len(frame_store)
+        logger.info(f"Extracted {len(frame_store)} frames.")
+
+    if len(indices) != len(frame_store):
+        logger.warning(f"WARNING: Mismatch between indices count ({len(indices)}) and extracted frames ({len(frame_store)}).")
 
     interpolater_inputs = []
-    for i in range(len(indices) - 1):
+    for i in range(min(len(indices), len(frame_store)) - 1):
         idx_curr = indices[i]
         idx_next = indices[i+1]
-        
+
         missing_count = idx_next - idx_curr - 1
 
         input_entry = {
-            'frame1_path': frame_paths[i],
-            'frame2_path': frame_paths[i+1],
+            'frame1_index': i,
+            'frame2_index': i + 1,
             'times_to_interpolate': missing_count
         }
         interpolater_inputs.append(input_entry)
 
     active_tasks = sum(1 for x in interpolater_inputs if x['times_to_interpolate'] > 0)
     logger.info(f"Prepared {len(interpolater_inputs)} total segments, {active_tasks} of which require interpolation.")
-    return interpolater_inputs
\ No newline at end of file
+    return frame_store, interpolater_inputs, index
@@ -0,0 +1,142 @@
+import os
+import uuid
+import hashlib
+import logging
+import threading
+import numpy as np
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_key(*parts):
+    """
+    Builds a cache key from strings, bytes and numpy arrays.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            part = np.ascontiguousarray(part).tobytes()
+        elif isinstance(part, str):
+            part = part.encode()
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def file_digest(file):
+    """
+    Returns (size in bytes, SHA-256 hex digest) of a path or a seekable binary file
+    object. File objects are rewound afterwards so they can still be uploaded.
+    """
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            return file_digest(f)
+
+    start = file.tell()
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: file.read(_CHUNK_SIZE), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(start)
+    return size, digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Size-bounded on-disk store of numpy arrays with least-recently-used eviction.
+
+    Entries are .npy files named by key. Reads refresh an entry's modification
+    time, which is what eviction orders by, so the cache survives restarts and
+    can be shared by several processes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npy"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        return entries
+
+    def contains(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        """
+        Returns the cached array for `key`, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            array = np.load(path)
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        return array
+
+    def put(self, key, array):
+        """
+        Stores an array under `key`, evicting old entries if over the size limit.
+        """
+        path = self._path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry {key}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        with self._lock:
+            self._size += os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.cache_dir, name))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep=None):
+        # `keep` names an entry that must survive, even on its own over the limit
+        entries = sorted(self._entries())
+        self._size = sum(size for _, _, size in entries)
+        for _, name, size in entries:
+            if self._size <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            self._remove(name)
+            self._size -= size
+        logger.info(f"Evicted cache entries in {self.cache_dir}, now {self._size / 1024 ** 2:.1f} MB.")
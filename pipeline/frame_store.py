@@ -0,0 +1,229 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import tempfile
+import logging
+import cv2
+import numpy as np
+from pipeline.batch_scheduler import available_memory_bytes
+from pipeline.profiler import profile_stage
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_UINT8_MAX_F = float(np.iinfo(np.uint8).max)
+
+
+def _resize_memmap(path, frames, used, capacity):
+    """
+    Rewrites the .npy at `path` to hold `capacity` frames, keeping the first `used`.
+    Returns the new writable memmap.
+    """
+    temp_path = f"{path}.resize"
+    resized = np.lib.format.open_memmap(temp_path, mode="w+", dtype=np.uint8,
+                                        shape=(capacity, *frames.shape[1:]))
+    resized[:used] = frames[:used]
+    resized.flush()
+    del resized
+    os.replace(temp_path, path)
+    return np.load(path, mmap_mode="r+")
+
+
+class FrameStore:
+    """
+    Decoded keyframes held as a single uint8 (N, H, W, 3) RGB array.
+
+    The array lives in memory, or in a memory-mapped .npy file when the video is
+    too large for the memory budget. Frames are addressed by index.
+    """
+
+    def __init__(self, frames, mmap_path=None, owns_file=False):
+        self.frames = frames
+        self.mmap_path = mmap_path
+        self._owns_file = owns_file
+        self._digests = {}
+
+    @classmethod
+    def from_video(cls, video_path, mmap_path=None, memory_fraction=0.5):
+        """
+        Decodes every frame of a video once.
+
+        Frames are written to a memory-mapped .npy at `mmap_path` if given, or to a
+        temporary one if the decoded video would exceed `memory_fraction` of the
+        available memory.
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        shape = (count, height, width, 3)
+        size = count * height * width * 3
+
+        owns_file = False
+        available = available_memory_bytes()
+        if mmap_path is None and available is not None and size > available * memory_fraction:
+            fd, mmap_path = tempfile.mkstemp(suffix=".npy", prefix="keyframes_")
+            os.close(fd)
+            owns_file = True
+
+        if mmap_path is not None:
+            logger.info(f"Decoding {count} frames into memory-mapped store {mmap_path}")
+            frames = np.lib.format.open_memmap(mmap_path, mode="w+", dtype=np.uint8, shape=shape)
+        else:
+            frames = np.empty(shape, dtype=np.uint8)
+
+        decoded = 0
+        resized = False
+        extra_frames = []
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if decoded == len(frames) and mmap_path is not None:
+                # The container under-reported its frames; double the file so no frame is lost
+                frames = _resize_memmap(mmap_path, frames, decoded, max(2 * decoded, 16))
+                resized = True
+            if decoded < len(frames):
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frames[decoded])
+            else:
+                extra_frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            decoded += 1
+        cap.release()
+
+        if decoded != count:
+            logger.warning(f"Container reported {count} frames but {decoded} were decoded.")
+        if resized:
+            # Trim the spare capacity so the file holds exactly the decoded frames
+            frames = _resize_memmap(mmap_path, frames, decoded, decoded)
+        elif decoded < count:
+            frames = frames[:decoded]
+        elif extra_frames:
+            frames = np.concatenate([frames, np.stack(extra_frames)])
+
+        if isinstance(frames, np.memmap):
+            frames.flush()
+
+        logger.info(f"Decoded {len(frames)} frames.")
+        return cls(frames, mmap_path=mmap_path, owns_file=owns_file)
+
+    @classmethod
+    def open(cls, mmap_path):
+        """
+        Opens an existing memory-mapped store read-only.
+        """
+        return cls(np.load(mmap_path, mmap_mode="r"), mmap_path=mmap_path)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def frame_shape(self):
+        return self.frames.shape[1:]
+
+    def get(self, index):
+        """
+        Returns frame `index` as a uint8 (H, W, 3) RGB array.
+        """
+        return self.frames[index]
+
+    def get_float(self, index):
+        """
+        Returns frame `index` as float32 in [0, 1], the layout the interpolator expects.
+        """
+        with profile_stage("frame_load", frames=1):
+            return self.get(index).astype(np.float32) / _UINT8_MAX_F
+
+    def digest(self, index):
+        """
+        Returns a content hash of frame `index`, computed once per frame.
+        """
+        if index not in self._digests:
+            frame = np.ascontiguousarray(self.get(index))
+            self._digests[index] = hashlib.blake2b(frame.tobytes(), digest_size=20).hexdigest()
+        return self._digests[index]
+
+    def close(self):
+        """
+        Releases the frames and removes the backing file if the store created it.
+        """
+        self.frames = None
+        if self._owns_file and self.mmap_path and os.path.exists(self.mmap_path):
+            os.remove(self.mmap_path)
+
+
+class LazyFrameStore(FrameStore):
+    """
+    Keyframes decoded on demand from an intra-only keyframe video.
+
+    Every frame is a keyframe, so any frame can be decoded by seeking straight to
+    it; consecutive reads continue without a seek. Nothing is decoded up front, and
+    only the last `cache_frames` frames are kept. The store opens from the video
+    path alone, so worker processes can share it without a spilled .npy.
+    """
+
+    def __init__(self, video_path, frame_count, cache_frames=4):
+        super().__init__(None)
+        self.video_path = video_path
+        self.frame_count = frame_count
+        self.cache_frames = cache_frames
+        self._cap = None
+        self._next_index = None
+        self._shape = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.frame_count
+
+    @property
+    def frame_shape(self):
+        if self._shape is None:
+            self._shape = self.get(0).shape
+        return self._shape
+
+    def _decode(self, index):
+        if self._cap is None:
+            self._cap = cv2.VideoCapture(self.video_path)
+            if not self._cap.isOpened():
+                raise ValueError(f"Could not open video: {self.video_path}")
+            self._next_index = 0
+        if index != self._next_index:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = self._cap.read()
+        if not ret:
+            self._next_index = None
+            raise IndexError(f"Frame {index} could not be decoded from {self.video_path}")
+        self._next_index = index + 1
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def get(self, index):
+        """
+        Returns frame `index` as a uint8 (H, W, 3) RGB array.
+        """
+        if not 0 <= index < self.frame_count:
+            raise IndexError(f"Frame {index} out of range for {self.frame_count} frames")
+        with self._lock:
+            if index in self._cache:
+                self._cache.move_to_end(index)
+                return self._cache[index]
+            with profile_stage("decode", frames=1):
+                frame = self._decode(index)
+            self._cache[index] = frame
+            if len(self._cache) > self.cache_frames:
+                self._cache.popitem(last=False)
+            return frame
+
+    def close(self):
+        """
+        Releases the decoder and the cached frames.
+        """
+        with self._lock:
+            if self._cap is not None:
+                self._cap.release()
+                self._cap = None
+            self._cache.clear()
@@ -1,18 +1,29 @@
-from typing import Generator, Iterable, List, Optional
+from typing import Dict, Generator, Iterable, List, Optional, Tuple
+import os
+import threading
+import time
 import numpy as np
 import tensorflow as tf
 import tensorflow_hub as hub
+from pipeline.batch_scheduler import auto_batch_size
+from pipeline.profiler import profile_stage
 
 
 """A wrapper class for running a frame interpolation based on the FILM model on TFHub
 
 Usage:
-  interpolator = Interpolator()
+  interpolator = get_interpolator()
   result_batch = interpolator(image_batch_0, image_batch_1, batch_dt)
   Where image_batch_1 and image_batch_2 are numpy tensors with TF standard
   (B,H,W,C) layout, batch_dt is the sub-frame time in range [0..1], (B,) layout.
+
+The model is read from the FILM_MODEL_PATH environment variable when set, which
+may point to a local SavedModel directory for offline use.
 """
 
+_DEFAULT_MODEL_PATH = "https://tfhub.dev/google/film/1"
+_MODEL_PATH_ENV = "FILM_MODEL_PATH"
+
 
 def _pad_to_align(x, align):
   """Pads image batch x so width and height divide by align.
@@ -50,24 +61,124 @@ def _pad_to_align(x, align):
   return padded_x, bbox_to_crop
 
 
+def _tile_starts(length: int, tile: int, overlap: int) -> Tuple[List[int], int]:
+  """Returns the start offsets and size of overlapping tiles covering length."""
+  if length <= tile:
+    return [0], length
+  stride = tile - overlap
+  starts = list(range(0, length - tile, stride)) + [length - tile]
+  return starts, tile
+
+
+def _feather(start: int, size: int, overlap: int, length: int) -> np.ndarray:
+  """1D blending ramp of a tile, fading in over the overlap at interior edges."""
+  ramp = np.ones(size, dtype=np.float32)
+  overlap = min(overlap, size)
+  if overlap > 0:
+    fade = (np.arange(overlap, dtype=np.float32) + 1) / (overlap + 1)
+    if start > 0:
+      ramp[:overlap] = fade
+    if start + size < length:
+      ramp[-overlap:] = np.minimum(ramp[-overlap:], fade[::-1])
+  return ramp
+
+
 class Interpolator:
   """A class for generating interpolated frames between two input frames.
 
   Uses the Film model from TFHub
   """
 
-  def __init__(self, align: int = 64) -> None:
+  def __init__(self, align: int = 64, model_path: Optional[str] = None,
+               tile_batch_size: Optional[int] = None) -> None:
     """Loads a saved model.
 
+    Tiling is chosen per call (tile_size, tile_overlap), so one loaded model
+    serves every tiling setting.
+
     Args:
       align: 'If >1, pad the input size so it divides with this before
         inference.'
+      model_path: TFHub handle or local SavedModel directory. Defaults to
+        $FILM_MODEL_PATH, then the TFHub FILM model.
+      tile_batch_size: Tiles per model call. Defaults to a size auto-tuned
+        from available memory.
     """
-    self._model = hub.load("https://tfhub.dev/google/film/1")
+    self.model_path = model_path or os.environ.get(_MODEL_PATH_ENV) or _DEFAULT_MODEL_PATH
+    start = time.perf_counter()
+    self._model = hub.load(self.model_path)
+    self.load_seconds = time.perf_counter() - start
     self._align = align
+    self._tile_batch_size = tile_batch_size
+
+    self._stats_lock = threading.Lock()
+    self._warm_shapes = set()
+    self._warmed_up = set()
+    self._latency = {'cold_calls': 0, 'cold_seconds': 0.0,
+                     'warm_calls': 0, 'warm_seconds': 0.0}
+
+  def model_version(self, tile_size: Optional[int] = None,
+                    tile_overlap: int = 64) -> str:
+    """Identifies the model and settings that affect the interpolated pixels."""
+    return (f'{self.model_path}|align={self._align}|tile={tile_size}'
+            f'|overlap={tile_overlap}')
+
+  def _check_tiling(self, tile_size: Optional[int], tile_overlap: int) -> None:
+    """Validates per-call tiling arguments.
+
+    Args:
+      tile_size: If set, frames larger than this are split into overlapping
+        square tiles of this size (a multiple of align) that run as one batch
+        and are feathered back together. Peak memory then scales with the
+        tile size instead of the frame size.
+      tile_overlap: Overlap in pixels between neighbouring tiles.
+    """
+    if tile_size is None:
+      return
+    if self._align and tile_size % self._align != 0:
+      raise ValueError(f'tile_size must be a multiple of align ({self._align}).')
+    if not 0 <= tile_overlap < tile_size:
+      raise ValueError('tile_overlap must be in [0, tile_size).')
+
+  def _record_latency(self, shape: Tuple[int, ...], seconds: float) -> None:
+    """The first call for an input shape pays graph tracing, so it is kept apart."""
+    with self._stats_lock:
+      kind = 'warm' if shape in self._warm_shapes else 'cold'
+      self._warm_shapes.add(shape)
+      self._latency[f'{kind}_calls'] += 1
+      self._latency[f'{kind}_seconds'] += seconds
+
+  def warmup(self, frame_shape: Tuple[int, ...], tile_size: Optional[int] = None,
+             tile_overlap: int = 64) -> None:
+    """Runs one dummy inference so later calls at this frame size are warm.
+
+    Args:
+      frame_shape: (height, width, channels) of the frames to interpolate.
+      tile_size: Tiling the later calls use, see _check_tiling.
+      tile_overlap: Tiling the later calls use, see _check_tiling.
+    """
+    key = (tuple(frame_shape), tile_size, tile_overlap)
+    if key in self._warmed_up:
+      return
+    frame = np.zeros((1, *frame_shape), dtype=np.float32)
+    self(frame, frame, np.full((1,), 0.5, dtype=np.float32),
+         tile_size=tile_size, tile_overlap=tile_overlap)
+    self._warmed_up.add(key)
+
+  def latency_stats(self) -> Dict[str, float]:
+    """Returns model load time and cold / warm per-call inference latency."""
+    with self._stats_lock:
+      latency = dict(self._latency)
+    stats = {'load_seconds': self.load_seconds}
+    for kind in ('cold', 'warm'):
+      calls = latency[f'{kind}_calls']
+      stats[f'{kind}_calls'] = calls
+      stats[f'{kind}_mean_seconds'] = latency[f'{kind}_seconds'] / calls if calls else 0.0
+    return stats
 
   def __call__(self, x0: np.ndarray, x1: np.ndarray,
-               dt: np.ndarray) -> np.ndarray:
+               dt: np.ndarray, tile_size: Optional[int] = None,
+               tile_overlap: int = 64) -> np.ndarray:
     """Generates an interpolated frame between given two batches of frames.
 
     All inputs should be np.float32 datatype.
@@ -76,21 +187,222 @@ class Interpolator:
       x0: First image batch. Dimensions: (batch_size, height, width, channels)
       x1: Second image batch. Dimensions: (batch_size, height, width, channels)
       dt: Sub-frame time. Range [0,1]. Dimensions: (batch_size,)
+      tile_size: See _check_tiling. No tiling by default.
+      tile_overlap: See _check_tiling.
 
     Returns:
       The result with dimensions (batch_size, height, width, channels).
     """
+    if self._uses_tiles(x0.shape, tile_size, tile_overlap):
+      pair_index = np.arange(len(dt), dtype=np.int32)
+      return self._interpolate_tiled(x0, x1, pair_index, dt, tile_size,
+                                     tile_overlap)
+
+    start = time.perf_counter()
+    shape = tuple(x0.shape[1:])
+    bbox_to_crop = None
     if self._align is not None:
-      x0, bbox_to_crop = _pad_to_align(x0, self._align)
-      x1, _ = _pad_to_align(x1, self._align)
+      with profile_stage('pad', frames=2 * len(x0)):
+        x0, bbox_to_crop = _pad_to_align(x0, self._align)
+        x1, _ = _pad_to_align(x1, self._align)
+
+    image = self._infer(x0, x1, dt, bbox_to_crop)
+    self._record_latency(shape, time.perf_counter() - start)
+    return image
 
+  def _infer(self, x0, x1, dt: np.ndarray,
+             bbox_to_crop: Optional[Dict[str, int]]) -> np.ndarray:
+    """Runs the model on already padded batches and undoes the padding."""
     inputs = {'x0': x0, 'x1': x1, 'time': dt[..., np.newaxis]}
-    result = self._model(inputs, training=False)
-    image = result['image']
+    with profile_stage('model', frames=len(dt)):
+      result = self._model(inputs, training=False)
+      image = result['image']
+
+    if bbox_to_crop is not None:
+      with profile_stage('crop', frames=len(dt)):
+        image = tf.image.crop_to_bounding_box(image, **bbox_to_crop)
+    with profile_stage('to_numpy', frames=len(dt)):
+      return image.numpy()
+
+  def _uses_tiles(self, shape: Tuple[int, ...], tile_size: Optional[int],
+                  tile_overlap: int) -> bool:
+    """Whether frames of this (batch, height, width, channels) shape are tiled."""
+    self._check_tiling(tile_size, tile_overlap)
+    return tile_size is not None and max(shape[1:3]) > tile_size
+
+  def _interpolate_tiled(self, frames0: np.ndarray, frames1: np.ndarray,
+                         pair_index: np.ndarray, dt: np.ndarray,
+                         tile_size: int, tile_overlap: int) -> np.ndarray:
+    """interpolate_pairs on overlapping tiles, blended with feathered weights."""
+    num_pairs, height, width, channels = frames0.shape
+    align = self._align or 1
+    pad_height, pad_width = -height % align, -width % align
+    offset_height, offset_width = pad_height // 2, pad_width // 2
+    padding = ((0, 0), (offset_height, pad_height - offset_height),
+               (offset_width, pad_width - offset_width), (0, 0))
+    with profile_stage('pad', frames=2 * num_pairs):
+      frames0 = np.pad(frames0, padding)
+      frames1 = np.pad(frames1, padding)
+    padded_height, padded_width = height + pad_height, width + pad_width
+
+    ys, tile_height = _tile_starts(padded_height, tile_size, tile_overlap)
+    xs, tile_width = _tile_starts(padded_width, tile_size, tile_overlap)
+    tiles = [(y, x) for y in ys for x in xs]
+    num_tiles = len(tiles)
+
+    # Normalise the feather weights so overlapping tiles sum to one.
+    weights = [np.outer(_feather(y, tile_height, tile_overlap, padded_height),
+                        _feather(x, tile_width, tile_overlap, padded_width))
+               for y, x in tiles]
+    total = np.zeros((padded_height, padded_width), dtype=np.float32)
+    for (y, x), weight in zip(tiles, weights):
+      total[y:y + tile_height, x:x + tile_width] += weight
+    weights = [weight / total[y:y + tile_height, x:x + tile_width]
+               for (y, x), weight in zip(tiles, weights)]
+
+    tiles0 = tf.constant(np.stack([frame[y:y + tile_height, x:x + tile_width]
+                                   for frame in frames0 for y, x in tiles]))
+    tiles1 = tf.constant(np.stack([frame[y:y + tile_height, x:x + tile_width]
+                                   for frame in frames1 for y, x in tiles]))
+
+    num_items = len(dt)
+    item_index = np.repeat(np.arange(num_items), num_tiles)
+    tile_index = np.tile(np.arange(num_tiles), num_items)
+    gather_index = (np.asarray(pair_index)[item_index] * num_tiles +
+                    tile_index).astype(np.int32)
+    tile_dt = np.asarray(dt, dtype=np.float32)[item_index]
+
+    batch_size = self._tile_batch_size
+    if batch_size is None:
+      batch_size = auto_batch_size((tile_height, tile_width), align=align)
+    shape = (tile_height, tile_width, channels)
+    output = np.zeros((num_items, height, width, channels), dtype=np.float32)
+    for b_start in range(0, len(gather_index), batch_size):
+      b_end = min(b_start + batch_size, len(gather_index))
+      start = time.perf_counter()
+      index = gather_index[b_start:b_end]
+      result = self._infer(tf.gather(tiles0, index), tf.gather(tiles1, index),
+                           tile_dt[b_start:b_end], None)
+      self._record_latency(shape, time.perf_counter() - start)
+
+      with profile_stage('tile_blend', frames=len(result)):
+        self._blend_tiles(output, result, item_index[b_start:b_end],
+                          tile_index[b_start:b_end], tiles, weights,
+                          (tile_height, tile_width),
+                          (offset_height, offset_width))
+    return output
+
+  @staticmethod
+  def _blend_tiles(output, result, item_index, tile_index, tiles, weights,
+                   tile_shape, offset):
+    """Adds weighted tile results into the cropped output frames."""
+    tile_height, tile_width = tile_shape
+    offset_height, offset_width = offset
+    height, width = output.shape[1:3]
+    for tile, item, t in zip(result, item_index, tile_index):
+      y, x = tiles[t]
+      # Intersect the tile with the unpadded frame.
+      y0, y1 = max(y, offset_height), min(y + tile_height, offset_height + height)
+      x0, x1 = max(x, offset_width), min(x + tile_width, offset_width + width)
+      blended = (tile[y0 - y:y1 - y, x0 - x:x1 - x] *
+                 weights[t][y0 - y:y1 - y, x0 - x:x1 - x, np.newaxis])
+      output[item, y0 - offset_height:y1 - offset_height,
+             x0 - offset_width:x1 - offset_width] += blended
+
+  def interpolate_pairs(self, frames0: np.ndarray, frames1: np.ndarray,
+                        pair_index: np.ndarray, dt: np.ndarray,
+                        batch_size: Optional[int] = None,
+                        tile_size: Optional[int] = None,
+                        tile_overlap: int = 64) -> np.ndarray:
+    """Interpolates many sub-frame times drawn from a few distinct frame pairs.
+
+    Each distinct frame is padded once and stacked; each batch is gathered
+    from the stacked frames with tf.gather, without building per-pair Python
+    copies. The gathered batch is still a new tensor (a host copy on CPU).
 
+    Args:
+      frames0: First frames of the distinct pairs. (num_pairs, height, width,
+        channels)
+      frames1: Second frames of the distinct pairs. (num_pairs, height, width,
+        channels)
+      pair_index: The pair each output item interpolates. (num_items,)
+      dt: Sub-frame time of each output item. Range [0,1]. (num_items,)
+      batch_size: Maximum number of items per model call. Defaults to all.
+      tile_size: See _check_tiling. No tiling by default.
+      tile_overlap: See _check_tiling.
+
+    Returns:
+      The result with dimensions (num_items, height, width, channels).
+    """
+    if self._uses_tiles(frames0.shape, tile_size, tile_overlap):
+      return self._interpolate_tiled(frames0, frames1, pair_index, dt,
+                                     tile_size, tile_overlap)
+
+    shape = tuple(frames0.shape[1:])
+    bbox_to_crop = None
     if self._align is not None:
-      image = tf.image.crop_to_bounding_box(image, **bbox_to_crop)
-    return image.numpy()
+      with profile_stage('pad', frames=2 * len(frames0)):
+        frames0, bbox_to_crop = _pad_to_align(frames0, self._align)
+        frames1, _ = _pad_to_align(frames1, self._align)
+
+    num_items = len(dt)
+    batch_size = batch_size or num_items
+    output = np.empty((num_items, *shape), dtype=np.float32)
+    for b_start in range(0, num_items, batch_size):
+      b_end = min(b_start + batch_size, num_items)
+      start = time.perf_counter()
+      index = pair_index[b_start:b_end]
+      x0 = tf.gather(frames0, index)
+      x1 = tf.gather(frames1, index)
+      output[b_start:b_end] = self._infer(x0, x1, dt[b_start:b_end], bbox_to_crop)
+      self._record_latency(shape, time.perf_counter() - start)
+    return output
+
+  def interpolate_times(self, frame0: np.ndarray, frame1: np.ndarray,
+                        dt: np.ndarray,
+                        batch_size: Optional[int] = None,
+                        tile_size: Optional[int] = None,
+                        tile_overlap: int = 64) -> np.ndarray:
+    """Generates frames at several sub-frame times between one pair of frames.
+
+    Args:
+      frame0: First image. (height, width, channels)
+      frame1: Second image. (height, width, channels)
+      dt: Sub-frame times. Range [0,1]. (num_times,)
+      batch_size: Maximum number of times per model call. Defaults to all.
+      tile_size: See _check_tiling. No tiling by default.
+      tile_overlap: See _check_tiling.
+
+    Returns:
+      The result with dimensions (num_times, height, width, channels).
+    """
+    pair_index = np.zeros(len(dt), dtype=np.int32)
+    return self.interpolate_pairs(frame0[np.newaxis], frame1[np.newaxis],
+                                  pair_index, dt, batch_size, tile_size,
+                                  tile_overlap)
+
+
+_interpolators: Dict[Tuple, Interpolator] = {}
+_interpolators_lock = threading.Lock()
+
+
+def get_interpolator(model_path: Optional[str] = None,
+                     align: int = 64) -> Interpolator:
+  """Returns the process-wide Interpolator, loading the model on first use.
+
+  The instance is shared by every caller in the process, whatever tiling they
+  pass per call, so the model is only loaded and warmed up once.
+
+  Args:
+    model_path: TFHub handle or local SavedModel directory, see Interpolator.
+    align: Passed to Interpolator.
+  """
+  model_path = model_path or os.environ.get(_MODEL_PATH_ENV) or _DEFAULT_MODEL_PATH
+  key = (model_path, align)
+  with _interpolators_lock:
+    if key not in _interpolators:
+      _interpolators[key] = Interpolator(align=align, model_path=model_path)
+    return _interpolators[key]
 
 
 def _recursive_generator(
@@ -141,4 +453,74 @@ def interpolate_recursively(
   for i in range(1, n):
     yield from _recursive_generator(frames[i - 1], frames[i], num_recursions, interpolator)
   # Separately yield the final frame.
-  yield frames[-1]
\ No newline at end of file
+  yield frames[-1]
+
+def interpolate_bisection(
+    frame1: np.ndarray, frame2: np.ndarray, num_frames: int,
+    interpolator: Interpolator, batch_size: Optional[int] = None,
+    resample: str = 'nearest', tile_size: Optional[int] = None,
+    tile_overlap: int = 64) -> np.ndarray:
+  """Generates evenly spaced in-between frames by recursive midpoint interpolation.
+
+  Midpoints of one recursion level become the anchors of the next, and every
+  level runs as one batched call. The recursion stops at the first level whose
+  time grid (spacing 1 / 2**depth) is at least as fine as the requested frames,
+  which are then taken from that grid.
+
+  Args:
+    frame1: Input image 1. Expected shape (H, W, 3).
+    frame2: Input image 2. Expected shape (H, W, 3).
+    num_frames: Number of in-between frames, at times k / (num_frames + 1).
+    interpolator: The frame interpolator instance.
+    batch_size: Maximum number of midpoints per model call.
+    resample: 'nearest' snaps each time to the closest grid frame, 'blend'
+      linearly mixes the two grid frames around it.
+    tile_size: Passed to Interpolator.interpolate_pairs.
+    tile_overlap: Passed to Interpolator.interpolate_pairs.
+
+  Returns:
+    The interpolated frames, excluding the inputs. (num_frames, H, W, 3)
+  """
+  if resample not in ('nearest', 'blend'):
+    raise ValueError(f"Unknown resample mode: {resample}")
+  if num_frames == 0:
+    return np.empty((0, *frame1.shape), dtype=np.float32)
+
+  depth = int(np.ceil(np.log2(num_frames + 1)))
+  grid_size = 2 ** depth
+  positions = np.arange(1, num_frames + 1) / (num_frames + 1) * grid_size
+  if resample == 'nearest':
+    needed = set(np.rint(positions).astype(int))
+  else:
+    lower = np.floor(positions).astype(int)
+    needed = set(lower) | set(np.minimum(lower + 1, grid_size))
+
+  # anchors maps grid index -> frame on the finest grid computed so far.
+  anchors = {0: frame1, grid_size: frame2}
+  for level in range(1, depth + 1):
+    step = grid_size >> level
+    midpoints = range(step, grid_size, 2 * step)
+    if level == depth:
+      # Only the last level is not reused as anchors, so skip unneeded frames.
+      midpoints = [m for m in midpoints if m in needed]
+    if not midpoints:
+      continue
+    frames0 = np.stack([anchors[m - step] for m in midpoints])
+    frames1 = np.stack([anchors[m + step] for m in midpoints])
+    pair_index = np.arange(len(midpoints), dtype=np.int32)
+    dt = np.full((len(midpoints),), 0.5, dtype=np.float32)
+    mid_frames = interpolator.interpolate_pairs(frames0, frames1, pair_index, dt,
+                                                batch_size, tile_size, tile_overlap)
+    anchors.update(zip(midpoints, mid_frames))
+
+  if resample == 'nearest':
+    return np.stack([anchors[int(i)] for i in np.rint(positions)])
+  frames = []
+  for position in positions:
+    low = int(np.floor(position))
+    weight = np.float32(position - low)
+    if weight == 0:
+      frames.append(anchors[low])
+    else:
+      frames.append((1 - weight) * anchors[low] + weight * anchors[low + 1])
+  return np.stack(frames).astype(np.float32)
@@ -0,0 +1,232 @@
+import os
+import csv
+import struct
+import logging
+import numpy as np
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAGIC = b"S2SI"
+VERSION = 1
+
+# magic, version, reserved, fps, source frame count, width, height,
+# retained index count, first index, run count
+_HEADER = struct.Struct("<4sHHdIIIIII")
+
+# Top-level MP4 'uuid' box type that carries the index inside the keyframe video
+MP4_BOX_UUID = bytes.fromhex("5332534990e611efa1d3325096b39f47")
+
+FRAME_INDEX_MAGIC = b"S2SF"
+FRAME_INDEX_VERSION = 1
+FRAME_INDEX_INTRA_ONLY = 0x1
+
+# magic, version, flags, frame count
+_FRAME_INDEX_HEADER = struct.Struct("<4sHHI")
+
+# Top-level MP4 'uuid' box type that carries the frame index
+FRAME_INDEX_BOX_UUID = bytes.fromhex("5332534690e611efa1d3325096b39f47")
+
+_OWN_BOXES = (MP4_BOX_UUID, FRAME_INDEX_BOX_UUID)
+
+
+def encode_indices(indices, fps=0.0, frame_count=0, width=0, height=0):
+    """
+    Serialises retained frame indices as a versioned, delta + run-length encoded blob.
+
+    Consecutive differences between indices are stored as (delta, run length) uint32
+    pairs, so long stretches with a constant keyframe spacing cost 8 bytes.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    if indices.size and (indices[0] < 0 or np.any(np.diff(indices) <= 0)):
+        raise ValueError("Retained indices must be non-negative and strictly increasing")
+
+    deltas = np.diff(indices)
+    if deltas.size:
+        boundaries = np.flatnonzero(np.diff(deltas)) + 1
+        starts = np.concatenate(([0], boundaries))
+        counts = np.diff(np.concatenate((starts, [deltas.size])))
+        runs = np.stack((deltas[starts], counts), axis=1).astype("<u4")
+    else:
+        runs = np.empty((0, 2), dtype="<u4")
+
+    first = int(indices[0]) if indices.size else 0
+    header = _HEADER.pack(MAGIC, VERSION, 0, float(fps), int(frame_count), int(width), int(height),
+                          int(indices.size), first, len(runs))
+    return header + runs.tobytes()
+
+
+def decode_indices(data):
+    """
+    Decodes a blob produced by encode_indices with a single vectorised expansion.
+    Returns a dict with 'indices' (int64 array), 'fps', 'frame_count', 'width' and 'height'.
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("Retained indices data is truncated")
+    magic, version, _, fps, frame_count, width, height, count, first, num_runs = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a retained indices blob")
+    if version > VERSION:
+        raise ValueError(f"Unsupported retained indices version {version}")
+
+    runs = np.frombuffer(data, dtype="<u4", count=2 * num_runs, offset=_HEADER.size).reshape(-1, 2)
+    indices = np.empty(count, dtype=np.int64)
+    if count:
+        indices[0] = first
+        indices[1:] = first + np.cumsum(np.repeat(runs[:, 0].astype(np.int64), runs[:, 1]))
+
+    return {
+        'indices': indices,
+        'fps': fps or None,
+        'frame_count': frame_count or None,
+        'width': width or None,
+        'height': height or None,
+    }
+
+
+def write_indices_file(path, indices, **metadata):
+    """
+    Writes a standalone binary index file. See encode_indices for `metadata`.
+    """
+    with open(path, "wb") as f:
+        f.write(encode_indices(indices, **metadata))
+    return path
+
+
+def _iter_mp4_boxes(f):
+    """
+    Yields (offset, size, type) for each top-level box of an open MP4 file.
+    """
+    file_size = os.fstat(f.fileno()).st_size
+    offset = 0
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+        elif size == 0:
+            size = file_size - offset
+        if size < 8:
+            break
+        yield offset, size, box_type
+        offset += size
+
+
+def embed_box(video_path, box_uuid, payload):
+    """
+    Appends `payload` to an MP4 as a top-level 'uuid' box. Our boxes are kept
+    together at the end of the file, and one with the same `box_uuid` is replaced.
+    Players ignore unknown uuid boxes.
+    """
+    box = struct.pack(">I4s", 8 + len(box_uuid) + len(payload), b"uuid") + box_uuid + payload
+
+    with open(video_path, "r+b") as f:
+        end = os.fstat(f.fileno()).st_size
+        kept = []
+        for offset, size, box_type in reversed(list(_iter_mp4_boxes(f))):
+            if box_type != b"uuid" or offset + size != end:
+                break
+            f.seek(offset + 8)
+            existing_uuid = f.read(len(box_uuid))
+            if existing_uuid not in _OWN_BOXES:
+                break
+            if existing_uuid != box_uuid:
+                f.seek(offset)
+                kept.insert(0, f.read(size))
+            end = offset
+        f.truncate(end)
+        f.seek(end)
+        f.write(b"".join(kept) + box)
+
+
+def read_box(video_path, box_uuid):
+    """
+    Returns the payload of the top-level 'uuid' box `box_uuid`, or None if there is none.
+    """
+    with open(video_path, "rb") as f:
+        for offset, size, box_type in _iter_mp4_boxes(f):
+            if box_type != b"uuid":
+                continue
+            f.seek(offset + 8)
+            if f.read(len(box_uuid)) == box_uuid:
+                return f.read(size - 8 - len(box_uuid))
+    return None
+
+
+def embed_indices(video_path, indices, **metadata):
+    """
+    Embeds the retained indices in an MP4, replacing a previously embedded index.
+    """
+    payload = encode_indices(indices, **metadata)
+    embed_box(video_path, MP4_BOX_UUID, payload)
+    logger.info(f"Embedded {len(indices)} retained indices ({len(payload)} bytes) in {video_path}")
+
+
+def read_embedded_indices(video_path):
+    """
+    Returns the index embedded in an MP4 by embed_indices, or None if there is none.
+    """
+    payload = read_box(video_path, MP4_BOX_UUID)
+    return decode_indices(payload) if payload is not None else None
+
+
+def encode_frame_index(frame_count, intra_only):
+    """
+    Serialises the keyframe video's frame count and whether every frame is a keyframe.
+    """
+    flags = FRAME_INDEX_INTRA_ONLY if intra_only else 0
+    return _FRAME_INDEX_HEADER.pack(FRAME_INDEX_MAGIC, FRAME_INDEX_VERSION, flags, frame_count)
+
+
+def decode_frame_index(data):
+    """
+    Decodes a blob produced by encode_frame_index.
+    Returns a dict with 'frame_count' and 'intra_only'.
+    """
+    if len(data) < _FRAME_INDEX_HEADER.size:
+        raise ValueError("Frame index data is truncated")
+    magic, version, flags, count = _FRAME_INDEX_HEADER.unpack_from(data)
+    if magic != FRAME_INDEX_MAGIC:
+        raise ValueError("Not a frame index blob")
+    if version > FRAME_INDEX_VERSION:
+        raise ValueError(f"Unsupported frame index version {version}")
+    return {
+        'frame_count': count,
+        'intra_only': bool(flags & FRAME_INDEX_INTRA_ONLY),
+    }
+
+
+def read_frame_index(video_path):
+    """
+    Returns the frame index embedded in an MP4, or None if there is none.
+    """
+    payload = read_box(video_path, FRAME_INDEX_BOX_UUID)
+    return decode_frame_index(payload) if payload is not None else None
+
+
+def _load_csv_indices(path):
+    # DictReader handles quoted fields; blank cells are skipped, as they always were
+    with open(path, "r", newline="") as f:
+        values = [row['Frame_Index'] for row in csv.DictReader(f)]
+    indices = np.asarray([int(value) for value in values if value and value.strip()], dtype=np.int64)
+    return {'indices': indices, 'fps': None, 'frame_count': None, 'width': None, 'height': None}
+
+
+def load_retained_indices(path):
+    """
+    Loads retained indices from a binary index file, an MP4 with an embedded index,
+    or a legacy CSV with a 'Frame_Index' column. Returns the dict of decode_indices.
+    """
+    with open(path, "rb") as f:
+        head = f.read(8)
+
+    if head[:4] == MAGIC:
+        with open(path, "rb") as f:
+            return decode_indices(f.read())
+    if head[4:8] == b"ftyp":
+        index = read_embedded_indices(path)
+        if index is None:
+            raise ValueError(f"No retained indices embedded in {path}")
+        return index
+    return _load_csv_indices(path)
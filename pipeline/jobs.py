@@ -0,0 +1,220 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job's progress callback once cancellation is requested.
+    """
+
+
+class Job:
+    """
+    A unit of background work with progress, a result and cooperative cancellation.
+
+    The job function receives the Job and should report through `job.update(p, msg)`,
+    which has the same signature as the pipeline progress callbacks. Cancellation is
+    observed at the next update.
+
+    A job shared by several holders (e.g. sessions waiting on the same output) is
+    only cancelled once every holder has cancelled; until then cancel() detaches.
+    """
+
+    def __init__(self, name, key=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.key = key
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Queued"
+        self.result = None
+        self.error = None
+        self.outputs = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_requested = threading.Event()
+        self._future = None
+        self._holders = set()
+        self._holders_lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_requested.is_set()
+
+    def update(self, p, msg=None):
+        """
+        Records progress in [0, 1]. Raises JobCancelled if the job was cancelled.
+        """
+        if self._cancel_requested.is_set():
+            raise JobCancelled(f"Job {self.id} cancelled")
+        self.progress = float(p)
+        if msg is not None:
+            self.message = msg
+
+    def add_output(self, item):
+        """
+        Publishes a partial result, e.g. a finished video chunk, while the job runs.
+        """
+        self.outputs.append(item)
+
+    def attach(self, holder):
+        """
+        Registers `holder` as waiting on this job.
+        """
+        with self._holders_lock:
+            self._holders.add(holder)
+
+    def cancel(self, holder=None):
+        """
+        Requests cancellation. A queued job is dropped; a running one stops at its next update.
+
+        With `holder`, only that holder is detached, and the job is cancelled once no
+        holder remains. Returns whether cancellation was requested.
+        """
+        if holder is not None:
+            with self._holders_lock:
+                self._holders.discard(holder)
+                if self._holders:
+                    logger.info(f"Detached from job {self.id}, {len(self._holders)} holders remain")
+                    return False
+        self._cancel_requested.set()
+        if self._future is not None and self._future.cancel():
+            self.status = CANCELLED
+            self.message = "Cancelled before it started"
+            self.finished_at = time.time()
+        return True
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded thread pool, so at most `max_workers` run at once and
+    the rest wait in a queue of at most `max_queued`.
+
+    Jobs outlive the Streamlit script run that submitted them, so a session can
+    poll by job ID across reruns. Submitting with a `key` that matches a queued or
+    running job returns that job instead of starting a duplicate; each submitter
+    passes a `holder` so that one of them cancelling does not stop it for the rest.
+    """
+
+    def __init__(self, max_workers=1, max_queued=16, retention_seconds=3600):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name, fn, *args, key=None, holder=None, **kwargs):
+        """
+        Queues `fn(job, *args, **kwargs)` and returns its Job, attached to `holder`.
+        Raises RuntimeError if the queue is full.
+        """
+        with self._lock:
+            self._prune()
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.key == key and not job.finished:
+                        logger.info(f"Joining existing job {job.id} for {key}")
+                        if holder is not None:
+                            job.attach(holder)
+                        return job
+
+            queued = sum(job.status == QUEUED for job in self._jobs.values())
+            if queued >= self.max_queued:
+                raise RuntimeError(f"Job queue is full ({queued} waiting), try again later")
+
+            job = Job(name, key)
+            if holder is not None:
+                job.attach(holder)
+            self._jobs[job.id] = job
+            job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+            logger.info(f"Queued job {job.id} ({name})")
+            return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancel_requested:
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            return
+        job.status = RUNNING
+        job.message = "Running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.progress = 1.0
+            job.status = DONE
+            job.message = "Done"
+        except JobCancelled:
+            job.status = CANCELLED
+            job.message = "Cancelled"
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.name}) failed: {e}")
+            job.error = e
+            job.status = FAILED
+            job.message = str(e)
+        finally:
+            job.finished_at = time.time()
+            logger.info(f"Job {job.id} ({job.name}) {job.status} after {job.elapsed():.1f}s")
+
+    def get(self, job_id):
+        """
+        Returns the Job with `job_id`, or None if it is unknown or was pruned.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id, holder=None):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel(holder)
+        return job
+
+    def jobs(self):
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [job.id for job in self._jobs.values() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """
+    Returns the process-wide JobManager shared by every page and session.
+    MAX_CONCURRENT_JOBS (default 1) caps how many jobs run at once.
+    """
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager(max_workers=int(os.environ.get("MAX_CONCURRENT_JOBS", "1")))
+        return _job_manager
@@ -0,0 +1,138 @@
+import os
+import struct
+import subprocess
+import logging
+import numpy as np
+from pipeline.indices_format import FRAME_INDEX_BOX_UUID, embed_box, encode_frame_index, read_frame_index
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Every frame an IDR frame, no B-frames, and the moov box ahead of the media data
+INTRA_ONLY_ARGS = [
+    "-c:v", "libx264",
+    "-g", "1", "-keyint_min", "1", "-sc_threshold", "0", "-bf", "0",
+    "-pix_fmt", "yuv420p",
+    "-movflags", "+faststart",
+]
+
+# Boxes on the path from moov to a track's sample tables
+_CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+
+def transcode_intra_only(video_path, crf=23):
+    """
+    Re-encodes a video in place so that every frame is a keyframe.
+    """
+    temp_path = f"{os.path.splitext(video_path)[0]}.intra.mp4"
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-i", video_path, *INTRA_ONLY_ARGS, "-crf", str(crf), temp_path]
+    try:
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+        os.replace(temp_path, video_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _boxes(data, start, end):
+    # Yields (type, payload start, payload end) for the boxes in data[start:end]
+    while start + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, start)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, start + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header or start + size > end:
+            break
+        yield box_type, start + header, start + size
+        start += size
+
+
+def _read_moov(video_path):
+    with open(video_path, "rb") as f:
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            size, box_type = struct.unpack(">I4s", header)
+            header_size = 8
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+                header_size = 16
+            elif size == 0:
+                return f.read() if box_type == b"moov" else None
+            if box_type == b"moov":
+                return f.read(size - header_size)
+            f.seek(size - header_size, 1)
+
+
+def _video_sample_tables(moov):
+    # Returns the stbl children of the first video track as {type: payload bytes}
+    for box_type, start, end in _boxes(moov, 0, len(moov)):
+        if box_type != b"trak":
+            continue
+        tables, handler = {}, None
+        pending = [(start, end)]
+        while pending:
+            start, end = pending.pop()
+            for child_type, child_start, child_end in _boxes(moov, start, end):
+                if child_type in _CONTAINER_BOXES:
+                    pending.append((child_start, child_end))
+                elif child_type == b"hdlr":
+                    # version/flags, pre_defined, handler_type
+                    handler = moov[child_start + 8:child_start + 12]
+                elif child_type in (b"stsz", b"stss"):
+                    tables[child_type] = moov[child_start:child_end]
+        if handler == b"vide":
+            return tables
+    return None
+
+
+def count_sync_samples(video_path):
+    """
+    Reads an MP4's video sample tables. Returns (samples, sync samples), where sync
+    samples are the frames a decoder can start from.
+    """
+    moov = _read_moov(video_path)
+    tables = _video_sample_tables(moov) if moov is not None else None
+    if not tables or b"stsz" not in tables:
+        raise ValueError(f"No video sample table in {video_path}")
+
+    count = struct.unpack_from(">I", tables[b"stsz"], 8)[0]
+    # Without an stss box every sample is a sync sample
+    if b"stss" not in tables:
+        return count, count
+    sync_count = struct.unpack_from(">I", tables[b"stss"], 4)[0]
+    sync_samples = np.frombuffer(tables[b"stss"], dtype=">u4", count=sync_count, offset=8)
+    return count, len(np.unique(sync_samples))
+
+
+def embed_frame_index(video_path):
+    """
+    Embeds the frame count in an MP4, flagged intra-only if every frame is a
+    keyframe. Returns the index as read_frame_index would.
+    """
+    count, sync_count = count_sync_samples(video_path)
+    intra_only = sync_count == count
+    embed_box(video_path, FRAME_INDEX_BOX_UUID, encode_frame_index(count, intra_only))
+    logger.info(f"Embedded frame index for {count} frames in {video_path} "
+                f"({'intra-only' if intra_only else f'{sync_count} keyframes'})")
+    return read_frame_index(video_path)
+
+
+def random_access_frame_count(video_path):
+    """
+    Returns the frame count of an intra-only keyframe video, or None if the video
+    has no frame index or needs sequential decoding.
+    """
+    try:
+        frame_index = read_frame_index(video_path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable frame index in {video_path}: {e}")
+        return None
+    if frame_index is None or not frame_index['intra_only']:
+        return None
+    return frame_index['frame_count']
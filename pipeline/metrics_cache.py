@@ -0,0 +1,27 @@
+import os
+from pipeline.disk_cache import DiskCache, file_digest, hash_key
+
+# Bump when the stored metrics change meaning for the same configuration
+METRICS_VERSION = "1"
+
+
+class MetricsCache(DiskCache):
+    """
+    Persistent cache of per-pair frame metrics arrays.
+
+    Entries are keyed by the SHA-256 of the video file and the metric
+    configuration, so re-uploading or re-sending the same source skips analysis
+    whatever the file is called. Digests are memoized by path, size and
+    modification time, so a file is hashed once per process.
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 ** 2):
+        super().__init__(cache_dir, max_bytes)
+        self._digests = {}
+
+    def metrics_key(self, video_path, *config):
+        stat = os.stat(video_path)
+        memo = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+        if memo not in self._digests:
+            self._digests[memo] = file_digest(video_path)[1]
+        return hash_key(self._digests[memo], METRICS_VERSION, *config)
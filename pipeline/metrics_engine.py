@@ -0,0 +1,525 @@
+import os
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+import numpy as np
+from pipeline.reduction_curve import REDUCTION_STEP_PERCENT, ReductionCurve
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Weights of KeyframeSelector's "Difference" metric
+MSE_WEIGHT = 0.5
+SSIM_WEIGHT = 0.3
+LPIPS_WEIGHT = 0.2
+
+
+def difference(mse, inv_ssim, lpips):
+    return MSE_WEIGHT * mse + SSIM_WEIGHT * inv_ssim + LPIPS_WEIGHT * lpips
+
+
+def ssim(gray1, gray2, win_size=7):
+    """
+    Mean SSIM of two grayscale frames, with skimage's defaults (uniform 7x7 window,
+    sample covariance, data range 255, borders excluded from the mean).
+    """
+    x = gray1.astype(np.float32)
+    y = gray2.astype(np.float32)
+    window = (win_size, win_size)
+    ux, uy = cv2.blur(x, window), cv2.blur(y, window)
+    uxx, uyy, uxy = cv2.blur(x * x, window), cv2.blur(y * y, window), cv2.blur(x * y, window)
+
+    cov_norm = win_size ** 2 / (win_size ** 2 - 1)
+    vx = cov_norm * (uxx - ux * ux)
+    vy = cov_norm * (uyy - uy * uy)
+    vxy = cov_norm * (uxy - ux * uy)
+
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    s = ((2 * ux * uy + c1) * (2 * vxy + c2)) / ((ux * ux + uy * uy + c1) * (vx + vy + c2))
+    pad = (win_size - 1) // 2
+    return float(s[pad:-pad, pad:-pad].mean(dtype=np.float64))
+
+
+def lpips_batch_fn(model, device):
+    """
+    Returns a batched LPIPS function for an LPIPS model.
+    The function takes two lists of BGR frames and returns one distance per pair.
+    """
+    import torch
+
+    def to_tensor(frames):
+        rgb = np.stack([cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames])
+        tensor = torch.from_numpy(rgb).permute(0, 3, 1, 2).float() / 255.0
+        return (tensor * 2 - 1).to(device)
+
+    def lpips_batch(frames1, frames2):
+        with torch.no_grad():
+            return model(to_tensor(frames1), to_tensor(frames2)).flatten().cpu().numpy()
+
+    return lpips_batch
+
+
+def selector_lpips(selector):
+    """
+    Returns a batched LPIPS function backed by a KeyframeSelector's model.
+    """
+    return lpips_batch_fn(selector.lpips_model, selector.device)
+
+
+def load_lpips(net="alex", device="cpu"):
+    """
+    Loads an LPIPS model, as KeyframeSelector does, and returns its batched function.
+    """
+    import lpips
+    return lpips_batch_fn(lpips.LPIPS(net=net, verbose=False).to(device), device)
+
+
+# Per-process LPIPS function, set up once by _init_worker
+_worker_lpips = None
+
+
+def _init_worker(lpips_loader, torch_threads):
+    """
+    Limits torch threading and loads the LPIPS model in a worker process.
+    """
+    global _worker_lpips
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    _worker_lpips = lpips_loader()
+
+
+def _cheap_range(engine, video_path, start, stop, calibration):
+    return engine._cheap_pass(video_path, start, stop, calibration, _worker_lpips)
+
+
+def _exact_range(engine, video_path, needed):
+    return engine._exact_pass(video_path, needed, _worker_lpips)
+
+
+class _Regression:
+    """
+    Least-squares fit of a target on a few cheap features, with its residual spread.
+    """
+
+    def __init__(self, features, target):
+        self.coefficients = np.linalg.lstsq(features, target, rcond=None)[0]
+        residuals = target - features @ self.coefficients
+        dof = max(1, len(target) - features.shape[1])
+        self.sigma = float(np.sqrt(np.sum(residuals ** 2) / dof))
+
+    def predict(self, features):
+        return np.maximum(features @ self.coefficients, 0.0)
+
+
+class CascadedMetrics:
+    """
+    Computes KeyframeSelector's per-pair metrics with most of the cost cut out.
+
+    MSE is exact and computed over batches of frames. SSIM is computed on frames
+    downscaled by `ssim_scale`, and LPIPS is estimated from MSE and the small-scale
+    SSIM. Both estimates are calibrated against exact values on
+    `calibration_pairs` evenly spaced pairs. Exact full-resolution SSIM and LPIPS
+    are then computed only for pairs whose estimated "Difference" lies within
+    `margin` residual standard deviations of the abs or delta threshold at one of
+    `adapt_factors`. By default these are the factors the reduction slider can
+    select, at its `REDUCTION_STEP_PERCENT` resolution, on the curve of the
+    estimated differences. Elsewhere the estimates cannot change which frames are kept.
+
+    With `workers` > 1, the video is split into frame ranges that share one frame
+    at each boundary, and both passes run in a process pool. Each worker loads its
+    own LPIPS model with `lpips_loader`. The ranges are merged back in order.
+    """
+
+    def __init__(self, batch_size=32, ssim_scale=0.5, calibration_pairs=48, margin=3.0,
+                 adapt_factors=None, lpips_batch_size=16, workers=1,
+                 lpips_loader=load_lpips, min_range_pairs=64):
+        self.batch_size = batch_size
+        self.ssim_scale = ssim_scale
+        self.calibration_pairs = calibration_pairs
+        self.margin = margin
+        self.adapt_factors = None if adapt_factors is None else np.asarray(adapt_factors, dtype=np.float64)
+        self.lpips_batch_size = lpips_batch_size
+        self.workers = workers
+        self.lpips_loader = lpips_loader
+        self.min_range_pairs = min_range_pairs
+
+    def config(self):
+        """
+        Returns the settings that affect the metrics, as cache key parts.
+        Batch sizes and the number of workers do not change the result.
+        """
+        factors = self.adapt_factors if self.adapt_factors is not None else f"steps:{REDUCTION_STEP_PERCENT}"
+        return ("cascaded", str(self.ssim_scale), str(self.calibration_pairs), str(self.margin), factors)
+
+    def _gray(self, frame):
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    def _small(self, gray):
+        if self.ssim_scale == 1:
+            return gray
+        return cv2.resize(gray, None, fx=self.ssim_scale, fy=self.ssim_scale, interpolation=cv2.INTER_AREA)
+
+    def _open(self, video_path, first_frame=0):
+        """
+        Opens the video positioned so that the next read returns `first_frame`.
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+        if first_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+            if int(round(cap.get(cv2.CAP_PROP_POS_FRAMES))) != first_frame:
+                # Seeking is not frame-accurate for every upload (variable frame rate,
+                # open GOPs); decode up to the frame instead of shifting the range
+                logger.info(f"Seek to frame {first_frame} of {video_path} is inexact, decoding up to it.")
+                cap.release()
+                cap = cv2.VideoCapture(video_path)
+                for _ in range(first_frame):
+                    if not cap.grab():
+                        break
+        return cap
+
+    def _cheap_pass(self, video_path, start, stop, calibration, lpips_fn, callback=None):
+        """
+        Reads frames `start` to `stop` once, for pairs start..stop-1: exact MSE,
+        small-scale SSIM, and exact SSIM and LPIPS for the calibration pairs.
+        Returns a dict; it covers fewer pairs, or none, if the video ends early.
+        """
+        began = time.perf_counter()
+        mse, small_ssim = [], []
+        exact_ssim, exact_lpips = {}, {}
+        pending = []
+        timings = {'ssim_full': 0.0, 'lpips': 0.0}
+
+        def flush_lpips():
+            if pending:
+                flush_start = time.perf_counter()
+                values = lpips_fn([p[1] for p in pending], [p[2] for p in pending])
+                timings['lpips'] += time.perf_counter() - flush_start
+                exact_lpips.update(zip([p[0] for p in pending], map(float, values)))
+                pending.clear()
+
+        cap = self._open(video_path, start)
+        ret, prev_frame = cap.read()
+        if not ret:
+            # The container overstated the frame count and the range lies past the end
+            cap.release()
+            return {
+                'start': start,
+                'mse': [],
+                'small_ssim': [],
+                'exact_ssim': exact_ssim,
+                'exact_lpips': exact_lpips,
+                'timings': timings,
+                'seconds': time.perf_counter() - began,
+            }
+        grays = [self._gray(prev_frame)]
+        smalls = [self._small(grays[0])]
+
+        pair = start
+        while pair < stop:
+            ret, frame = cap.read()
+            if ret:
+                grays.append(self._gray(frame))
+                smalls.append(self._small(grays[-1]))
+                if pair in calibration:
+                    ssim_start = time.perf_counter()
+                    exact_ssim[pair] = 1 - ssim(grays[-2], grays[-1])
+                    timings['ssim_full'] += time.perf_counter() - ssim_start
+                    pending.append((pair, prev_frame, frame))
+                    if len(pending) >= self.lpips_batch_size:
+                        flush_lpips()
+                prev_frame = frame
+                pair += 1
+
+            done = not ret or pair == stop
+            if len(grays) > self.batch_size or (done and len(grays) > 1):
+                stack = np.stack(grays).astype(np.float32)
+                mse.extend(np.mean((stack[1:] - stack[:-1]) ** 2, axis=(1, 2), dtype=np.float64))
+                small_ssim.extend(1 - ssim(a, b) for a, b in zip(smalls[:-1], smalls[1:]))
+                grays, smalls = grays[-1:], smalls[-1:]
+                if callback:
+                    callback((pair - start) / (stop - start), f"Computing metrics: {pair}/{stop}")
+            if done:
+                break
+        cap.release()
+        flush_lpips()
+
+        return {
+            'start': start,
+            'mse': mse,
+            'small_ssim': small_ssim,
+            'exact_ssim': exact_ssim,
+            'exact_lpips': exact_lpips,
+            'timings': timings,
+            'seconds': time.perf_counter() - began,
+        }
+
+    def _exact_pass(self, video_path, needed, lpips_fn, callback=None):
+        """
+        Reads the frames spanning `needed` and computes exact SSIM and LPIPS for those pairs.
+        """
+        exact_ssim, exact_lpips = {}, {}
+        if not needed:
+            return exact_ssim, exact_lpips
+
+        order = sorted(needed)
+        pending = []
+
+        def flush_lpips():
+            if pending:
+                values = lpips_fn([p[1] for p in pending], [p[2] for p in pending])
+                exact_lpips.update(zip([p[0] for p in pending], map(float, values)))
+                pending.clear()
+
+        cap = self._open(video_path, order[0])
+        ret, prev_frame = cap.read()
+        if not ret:
+            cap.release()
+            return exact_ssim, exact_lpips
+        for pair in range(order[0], order[-1] + 1):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if pair in needed:
+                exact_ssim[pair] = 1 - ssim(self._gray(prev_frame), self._gray(frame))
+                pending.append((pair, prev_frame, frame))
+                if len(pending) >= self.lpips_batch_size:
+                    flush_lpips()
+                    if callback:
+                        callback(len(exact_lpips) / len(order),
+                                 f"Refining ambiguous pairs: {len(exact_lpips)}/{len(order)}")
+            prev_frame = frame
+        cap.release()
+        flush_lpips()
+        return exact_ssim, exact_lpips
+
+    def _ambiguous(self, diffs, sigma):
+        """
+        Returns the pairs whose keep decision could flip at any adapt factor, given
+        a standard error of `sigma` in each estimated difference.
+        """
+        deltas = np.abs(np.diff(diffs, prepend=diffs[0]))
+        needed = np.zeros(len(diffs), dtype=bool)
+        factors = self.adapt_factors
+        if factors is None:
+            # The step points move with the refined values, but no further than the
+            # values themselves, which the tolerance below already allows for
+            factors = ReductionCurve(diffs).slider_factors()
+        for factor in factors:
+            abs_threshold = diffs.mean() + factor * diffs.std()
+            delta_threshold = deltas.mean() + factor * deltas.std()
+
+            # Estimation errors move each value, and through the mean and std, the
+            # threshold too. A delta depends on two differences, so its error doubles.
+            tolerance = (self.margin + 1 + abs(factor)) * sigma
+            abs_near = np.abs(diffs - abs_threshold) <= tolerance
+            abs_possible = diffs >= abs_threshold - tolerance
+            delta_near = np.abs(deltas - delta_threshold) <= 2 * tolerance
+            delta_possible = deltas >= delta_threshold - 2 * tolerance
+
+            needed |= abs_near & delta_possible
+            delta_ambiguous = delta_near & abs_possible
+            needed |= delta_ambiguous
+            needed[:-1] |= delta_ambiguous[1:]
+        return needed
+
+    def _ranges(self, total_pairs):
+        """
+        Splits pairs into contiguous [start, stop) ranges, about four per worker.
+        """
+        if self.workers <= 1:
+            return [(0, total_pairs)]
+        size = max(self.min_range_pairs, -(-total_pairs // (4 * self.workers)))
+        return [(start, min(start + size, total_pairs)) for start in range(0, total_pairs, size)]
+
+    def _run(self, executor, fn, tasks, callback, low, high, message):
+        """
+        Runs `fn(self, video_path, ...)` for each task in the pool and returns the
+        results in task order, reporting progress between `low` and `high`.
+        """
+        futures = [executor.submit(fn, self, *task) for task in tasks]
+        for done, _ in enumerate(as_completed(futures), start=1):
+            if callback:
+                callback(low + (high - low) * done / len(futures), f"{message}: {done}/{len(futures)} ranges")
+        return [future.result() for future in futures]
+
+    def compute(self, video_path, lpips_fn, callback=None):
+        """
+        Returns (metrics, report). `metrics` has KeyframeSelector's layout: one row of
+        (MSE, inverse SSIM, LPIPS, Difference) per consecutive frame pair.
+        `lpips_fn(frames1, frames2)` returns the LPIPS distance of each pair of BGR
+        frames; it is used in-process, while workers load their own.
+        """
+        start = time.perf_counter()
+        cap = self._open(video_path)
+        total_pairs = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) - 1)
+        cap.release()
+        if total_pairs == 0:
+            raise ValueError("Video must contain at least two frames")
+
+        # Short videos are not worth calibrating: every pair is computed exactly
+        if total_pairs <= 3 * self.calibration_pairs:
+            calibration = set(range(total_pairs))
+        else:
+            calibration = set(np.linspace(0, total_pairs - 1, self.calibration_pairs).round().astype(int).tolist())
+
+        ranges = self._ranges(total_pairs)
+        executor = None
+        if len(ranges) > 1:
+            torch_threads = max(1, (os.cpu_count() or 1) // self.workers)
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.lpips_loader, torch_threads),
+            )
+            logger.info(f"Computing metrics for {total_pairs} pairs in {len(ranges)} ranges on {self.workers} workers.")
+        try:
+            if executor is None:
+                progress = (lambda p, msg: callback(0.8 * p, msg)) if callback else None
+                chunks = [self._cheap_pass(video_path, 0, total_pairs, calibration, lpips_fn, progress)]
+            else:
+                tasks = [(video_path, a, b, {i for i in calibration if a <= i < b}) for a, b in ranges]
+                chunks = self._run(executor, _cheap_range, tasks, callback, 0.0, 0.8, "Computing metrics")
+
+            # Merge ranges in order, stopping at the first that ended early
+            mse, small_ssim, exact_ssim, exact_lpips = [], [], {}, {}
+            timings = {'ssim_full': 0.0, 'lpips': 0.0}
+            cheap_seconds = 0.0
+            for (a, b), chunk in zip(ranges, chunks):
+                mse.extend(chunk['mse'])
+                small_ssim.extend(chunk['small_ssim'])
+                exact_ssim.update(chunk['exact_ssim'])
+                exact_lpips.update(chunk['exact_lpips'])
+                for name in timings:
+                    timings[name] += chunk['timings'][name]
+                cheap_seconds += chunk['seconds']
+                if len(chunk['mse']) < b - a:
+                    break
+            mse, small_ssim = np.array(mse), np.array(small_ssim)
+            pairs = len(mse)
+
+            calibrated = sorted(i for i in exact_lpips if i < pairs)
+            if len(calibrated) == pairs:
+                inv_ssim = np.array([exact_ssim[i] for i in range(pairs)])
+                lpips = np.array([exact_lpips[i] for i in range(pairs)])
+                uncertainty = 0.0
+                needed = set()
+            else:
+                ssim_fit = _Regression(np.column_stack([np.ones(len(calibrated)), small_ssim[calibrated]]),
+                                       np.array([exact_ssim[i] for i in calibrated]))
+                inv_ssim = ssim_fit.predict(np.column_stack([np.ones(pairs), small_ssim]))
+
+                features = np.column_stack([np.ones(pairs), small_ssim, np.sqrt(mse)])
+                lpips_fit = _Regression(features[calibrated], np.array([exact_lpips[i] for i in calibrated]))
+                lpips = lpips_fit.predict(features)
+
+                for i in calibrated:
+                    inv_ssim[i], lpips[i] = exact_ssim[i], exact_lpips[i]
+                sigma = SSIM_WEIGHT * ssim_fit.sigma + LPIPS_WEIGHT * lpips_fit.sigma
+                uncertainty = self.margin * sigma
+                needed = set(np.flatnonzero(self._ambiguous(difference(mse, inv_ssim, lpips), sigma)).tolist())
+                needed -= set(calibrated)
+
+            refined_ssim, refined_lpips = {}, {}
+            if executor is None:
+                progress = (lambda p, msg: callback(0.8 + 0.2 * p, msg)) if callback else None
+                refined_ssim, refined_lpips = self._exact_pass(video_path, needed, lpips_fn, progress)
+            elif needed:
+                tasks = [(video_path, {i for i in needed if a <= i < b}) for a, b in ranges]
+                tasks = [task for task in tasks if task[1]]
+                for exact_ssim_part, exact_lpips_part in self._run(executor, _exact_range, tasks, callback,
+                                                                   0.8, 1.0, "Refining ambiguous pairs"):
+                    refined_ssim.update(exact_ssim_part)
+                    refined_lpips.update(exact_lpips_part)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        for i in refined_lpips:
+            inv_ssim[i], lpips[i] = refined_ssim[i], refined_lpips[i]
+
+        metrics = np.zeros((pairs, 4), dtype=np.float32)
+        metrics[:, 0] = mse
+        metrics[:, 1] = inv_ssim
+        metrics[:, 2] = lpips
+        metrics[:, 3] = difference(mse, inv_ssim, lpips)
+        finished = time.perf_counter()
+
+        # Exhaustive cost: one sequential read and MSE plus full-size SSIM and LPIPS on every pair
+        exact_pairs = len(calibrated) + len(refined_lpips)
+        per_pair = (timings['ssim_full'] + timings['lpips']) / max(1, len(calibrated))
+        exhaustive_seconds = cheap_seconds - timings['ssim_full'] - timings['lpips'] + pairs * per_pair
+        report = {
+            'pairs': pairs,
+            'workers': self.workers,
+            'ranges': len(ranges),
+            'calibration_pairs': len(calibrated),
+            'refined_pairs': len(refined_lpips),
+            # No pairs if the video could not be read past its first frame
+            'exact_fraction': exact_pairs / pairs if pairs else 0.0,
+            'uncertainty': float(uncertainty),
+            'seconds': finished - start,
+            'estimated_exhaustive_seconds': exhaustive_seconds,
+            'estimated_speedup': exhaustive_seconds / (finished - start),
+        }
+        logger.info(f"Metrics for {pairs} pairs in {report['seconds']:.1f}s: exact LPIPS on {exact_pairs} "
+                    f"({100 * report['exact_fraction']:.1f}%), difference uncertainty ±{uncertainty:.4f}, "
+                    f"estimated {report['estimated_speedup']:.1f}x faster than exhaustive.")
+        if callback:
+            callback(1.0, f"Computed metrics for {pairs} pairs")
+        return metrics, report
+
+
+def apply_metrics(selector, metrics):
+    """
+    Fills a KeyframeSelector's metrics as selector.compute_metrics() would.
+    """
+    selector.metrics = metrics
+    selector.frame_pairs = len(metrics)
+    selector.metrics_computed = True
+
+
+def load_cached_metrics(video_path, cache, engine=None):
+    """
+    Reads the metrics of `video_path` from a MetricsCache. Returns (metrics, report),
+    or (None, None) on a miss. No selector or LPIPS model is needed.
+    """
+    engine = engine or CascadedMetrics()
+    start = time.perf_counter()
+    metrics = cache.get(cache.metrics_key(video_path, *engine.config()))
+    if metrics is None:
+        return None, None
+    logger.info(f"Loaded cached metrics for {len(metrics)} pairs of {video_path}.")
+    return metrics, {'pairs': len(metrics), 'cached': True, 'seconds': time.perf_counter() - start}
+
+
+def compute_selector_metrics(selector, callback=None, engine=None, cache=None):
+    """
+    Fills a KeyframeSelector's metrics with the cascaded engine, in place of
+    selector.compute_metrics(). With a MetricsCache, a video already analysed
+    with the same configuration is read back instead. Returns the engine's
+    report, with 'cached' set on a hit.
+    """
+    engine = engine or CascadedMetrics()
+    if cache is not None:
+        metrics, report = load_cached_metrics(selector.video_path, cache, engine)
+        if metrics is not None:
+            apply_metrics(selector, metrics)
+            if callback:
+                callback(1.0, f"Loaded cached metrics for {len(metrics)} pairs")
+            return report
+
+    metrics, report = engine.compute(selector.video_path, selector_lpips(selector), callback)
+    if cache is not None:
+        cache.put(cache.metrics_key(selector.video_path, *engine.config()), metrics)
+    apply_metrics(selector, metrics)
+    report['cached'] = False
+    return report
@@ -0,0 +1,191 @@
+import os
+import tempfile
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from pipeline.batch_scheduler import available_memory_bytes
+from pipeline.frame_store import FrameStore, LazyFrameStore
+from pipeline.profiler import Profiler, activate, current_profiler
+from pipeline.video_writer import open_video_writer, to_uint8
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Per-process state, set up once by _init_worker
+_worker_store = None
+_worker_interpolator = None
+
+
+def _init_worker(store_source, model_path, intra_op_threads, inter_op_threads):
+    """
+    Configures TF threading and loads the frame store and model in a worker process.
+    `store_source` is ("mmap", path to .npy) or ("video", path, frame count).
+    """
+    global _worker_store, _worker_interpolator
+    import tensorflow as tf
+    from pipeline.google_film.interpolater import get_interpolator
+
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+    if store_source[0] == "video":
+        _worker_store = LazyFrameStore(*store_source[1:])
+    else:
+        _worker_store = FrameStore.open(store_source[1])
+    _worker_interpolator = get_interpolator(model_path)
+
+
+def _reconstruct_shard(shard_inputs, is_last, options):
+    """
+    Reconstructs a contiguous run of segments and returns its frames as uint8,
+    along with the shard's per-stage profile and triage route counts.
+
+    The closing keyframe is left to the next shard, which starts with it.
+    """
+    from pipeline.reconstruction import iter_reconstructed_frames
+
+    profiler = Profiler()
+    with activate(profiler):
+        frames = [to_uint8(frame) for frame in
+                  iter_reconstructed_frames(_worker_store, shard_inputs, _worker_interpolator, **options)]
+    triage = options.get('triage')
+    counts = dict(triage.counts) if triage is not None else {}
+    return (frames if is_last else frames[:-1]), profiler.stages(), counts
+
+
+def _shard_frames(shard):
+    return sum(input_data['times_to_interpolate'] + 1 for input_data in shard)
+
+
+def _in_flight_frame_budget(frame_shape, memory_fraction=0.25):
+    """
+    Returns how many finished uint8 frames may be buffered at once within a fraction
+    of the free memory, or None if the free memory is unknown.
+    """
+    available = available_memory_bytes()
+    if available is None:
+        return None
+    return max(1, int(available * memory_fraction // int(np.prod(frame_shape))))
+
+
+def shard_segments(inputs, frames_per_shard=64):
+    """
+    Splits segments into contiguous shards of roughly `frames_per_shard` output frames.
+    """
+    shards, shard, shard_frames = [], [], 0
+    for input_data in inputs:
+        shard.append(input_data)
+        shard_frames += input_data['times_to_interpolate'] + 1
+        if shard_frames >= frames_per_shard:
+            shards.append(shard)
+            shard, shard_frames = [], 0
+    if shard:
+        shards.append(shard)
+    return shards
+
+
+def reconstruct_video_parallel(frame_store, inputs, output_path, fps=30, workers=None,
+                               intra_op_threads=None, inter_op_threads=1, model_path=None,
+                               tile_size=None, tile_overlap=64, batch_size=1, strategy="linear",
+                               recursive_min_gap=8, resample="nearest", cache=None, frames_per_shard=64,
+                               queue_size=8, progress_callback=None, chunk_seconds=None, on_chunk=None,
+                               triage=None, memory_fraction=0.25):
+    """
+    Reconstructs segments in a pool of worker processes, each with its own Interpolator.
+
+    Segments are sharded into contiguous runs, and finished shards are written in
+    order by a reassembler that keeps at most two shards per worker in flight, and
+    no more frames than fit in `memory_fraction` of the free memory. Shards shrink
+    when needed so every worker still gets one. On an error or cancellation, queued
+    shards are dropped and only the running ones are waited for.
+    Workers read keyframes from a memory-mapped FrameStore, so an in-memory store
+    is spilled to a temporary .npy first; a LazyFrameStore is reopened in each
+    worker, which decodes only its own shards' keyframes. `chunk_seconds`, `on_chunk` and `triage`
+    are as for reconstruct_video; each shard triages with its own copy of `triage`,
+    and the route counts are merged back into it. Returns the number of frames written.
+    """
+    workers = workers or os.cpu_count() or 1
+    intra_op_threads = intra_op_threads or max(1, (os.cpu_count() or 1) // workers)
+
+    temp_path = None
+    if isinstance(frame_store, LazyFrameStore):
+        store_source = ("video", frame_store.video_path, len(frame_store))
+    elif frame_store.mmap_path is not None:
+        store_source = ("mmap", frame_store.mmap_path)
+    else:
+        fd, temp_path = tempfile.mkstemp(suffix=".npy", prefix="keyframes_")
+        os.close(fd)
+        np.save(temp_path, frame_store.frames)
+        store_source = ("mmap", temp_path)
+
+    # Each in-flight shard comes back as a list of frames, which the parent buffers
+    budget = _in_flight_frame_budget(frame_store.frame_shape, memory_fraction)
+    if budget is not None:
+        frames_per_shard = max(1, min(frames_per_shard, budget // (2 * workers)))
+    shards = shard_segments(inputs, frames_per_shard)
+    options = {
+        'batch_size': batch_size,
+        'strategy': strategy,
+        'recursive_min_gap': recursive_min_gap,
+        'resample': resample,
+        'cache': cache,
+        'triage': triage,
+        'tile_size': tile_size,
+        'tile_overlap': tile_overlap,
+    }
+    logger.info(f"Reconstructing {len(inputs)} segments in {len(shards)} shards "
+                f"on {workers} workers x {intra_op_threads} TF threads.")
+
+    profiler = current_profiler()
+    segments_done = 0
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(store_source, model_path, intra_op_threads, inter_op_threads),
+    )
+    try:
+        with open_video_writer(output_path, fps, queue_size, chunk_seconds, on_chunk) as writer:
+            in_flight = deque()
+            in_flight_frames = 0
+            next_shard = 0
+            while next_shard < len(shards) or in_flight:
+                while next_shard < len(shards) and len(in_flight) < 2 * workers:
+                    shard_frames = _shard_frames(shards[next_shard])
+                    # A shard larger than the budget still runs, on its own
+                    if in_flight and budget is not None and in_flight_frames + shard_frames > budget:
+                        break
+                    is_last = next_shard == len(shards) - 1
+                    future = executor.submit(_reconstruct_shard, shards[next_shard], is_last, options)
+                    in_flight.append((future, len(shards[next_shard]), shard_frames))
+                    in_flight_frames += shard_frames
+                    next_shard += 1
+
+                # Results are consumed in submission order, which is segment order
+                future, shard_length, shard_frames = in_flight.popleft()
+                frames, stages, counts = future.result()
+                in_flight_frames -= shard_frames
+                for frame in frames:
+                    writer.write(frame)
+                if profiler is not None:
+                    profiler.merge(stages)
+                if triage is not None:
+                    triage.merge(counts)
+
+                segments_done += shard_length
+                if progress_callback:
+                    progress_callback(segments_done / len(inputs),
+                                      f"Interpolated segment {segments_done}/{len(inputs)}")
+    finally:
+        # Queued shards are cancelled, so a failed or cancelled job does not run them
+        executor.shutdown(wait=True, cancel_futures=True)
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    logger.info(f'Final video created with {writer.frames_written} frames')
+    if triage is not None:
+        logger.info(f"Triage: {triage.report()['percent']} percent of segments per route.")
+    return writer.frames_written
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_active_profiler = contextvars.ContextVar("active_profiler", default=None)
+
+
+def current_rss_bytes():
+    """
+    Returns the resident set size of this process in bytes, or 0 if unknown.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        # ru_maxrss is the peak, in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    return 0
+
+
+class Profiler:
+    """
+    Accumulates wall time, frame counts and peak RSS per pipeline stage.
+
+    RSS is read by a sampler thread every `rss_interval` seconds while any stage
+    is open, not on every record, and each sample counts toward the peak of every
+    open stage and of the job. Stages shorter than the interval are only caught
+    when a sample lands inside them.
+
+    Usage:
+        profiler = Profiler(job_id="abc")
+        with activate(profiler):
+            ...  # code instrumented with profile_stage() records into profiler
+        profiler.to_json("profiles/abc.json")
+    """
+
+    def __init__(self, job_id=None, rss_interval=0.05):
+        self.job_id = job_id
+        self.started_at = time.time()
+        self.rss_interval = rss_interval
+        self._stages = {}
+        self._open = {}  # stage name -> number of open blocks
+        self._peak_rss_bytes = 0
+        self._sampler = None
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, frames=0, peak_rss_bytes=0, calls=1):
+        # Called per frame from hot loops, so this only updates counters
+        with self._lock:
+            stage = self._new_stage(name)
+            stage['calls'] += calls
+            stage['seconds'] += seconds
+            stage['frames'] += frames
+            stage['peak_rss_bytes'] = max(stage['peak_rss_bytes'], peak_rss_bytes)
+            self._peak_rss_bytes = max(self._peak_rss_bytes, peak_rss_bytes)
+
+    def _new_stage(self, name):
+        return self._stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'frames': 0, 'peak_rss_bytes': 0})
+
+    def _sample_rss(self):
+        # Runs until no stage has been open for a whole interval
+        idle = False
+        while True:
+            rss = current_rss_bytes()
+            with self._lock:
+                if self._open:
+                    idle = False
+                    self._peak_rss_bytes = max(self._peak_rss_bytes, rss)
+                    for name in self._open:
+                        stage = self._new_stage(name)
+                        stage['peak_rss_bytes'] = max(stage['peak_rss_bytes'], rss)
+                elif idle:
+                    self._sampler = None
+                    return
+                else:
+                    idle = True
+            time.sleep(self.rss_interval)
+
+    def _enter(self, name):
+        with self._lock:
+            self._open[name] = self._open.get(name, 0) + 1
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_rss, name="rss-sampler", daemon=True)
+                self._sampler.start()
+
+    def _exit(self, name):
+        with self._lock:
+            self._open[name] -= 1
+            if not self._open[name]:
+                del self._open[name]
+
+    @contextmanager
+    def stage(self, name, frames=0):
+        """
+        Times the enclosed block. Yields a dict whose 'frames' may be updated inside it.
+        """
+        counters = {'frames': frames}
+        self._enter(name)
+        start = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            self.record(name, time.perf_counter() - start, counters['frames'])
+            self._exit(name)
+
+    def stages(self):
+        """
+        Returns a copy of the raw per-stage counters.
+        """
+        with self._lock:
+            return {name: dict(stage) for name, stage in self._stages.items()}
+
+    def merge(self, stages):
+        """
+        Adds counters collected elsewhere, e.g. by a worker process.
+        """
+        for name, stage in stages.items():
+            self.record(name, stage['seconds'], stage['frames'], stage['peak_rss_bytes'], stage['calls'])
+
+    def summary(self):
+        """
+        Returns one row per stage with wall time, frames/sec and peak RSS. The peak
+        is None for a stage no sample landed in.
+        """
+        rows = []
+        for name, stage in self.stages().items():
+            rows.append({
+                'stage': name,
+                'calls': stage['calls'],
+                'seconds': round(stage['seconds'], 4),
+                'frames': stage['frames'],
+                'frames_per_sec': round(stage['frames'] / stage['seconds'], 2) if stage['seconds'] else 0.0,
+                'peak_rss_mb': round(stage['peak_rss_bytes'] / 1024 ** 2, 1) if stage['peak_rss_bytes'] else None,
+            })
+        return sorted(rows, key=lambda row: row['seconds'], reverse=True)
+
+    def to_dict(self):
+        # The peak over this job's stages, in this process and any merged workers
+        peak = self._peak_rss_bytes or current_rss_bytes()
+        return {
+            'job_id': self.job_id,
+            'started_at': self.started_at,
+            'wall_seconds': time.time() - self.started_at,
+            'peak_rss_mb': round(peak / 1024 ** 2, 1),
+            'stages': self.summary(),
+        }
+
+    def to_json(self, path):
+        """
+        Writes the job profile to `path` and returns the path.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        logger.info(f"Profile written to {path}")
+        return path
+
+
+def current_profiler():
+    return _active_profiler.get()
+
+
+@contextmanager
+def activate(profiler):
+    """
+    Makes `profiler` the target of profile_stage() in this context.
+    """
+    token = _active_profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _active_profiler.reset(token)
+
+
+@contextmanager
+def profile_stage(name, frames=0, profiler=None):
+    """
+    Times the enclosed block into `profiler`, or the active one. No-op if neither.
+    """
+    profiler = profiler or _active_profiler.get()
+    if profiler is None:
+        yield {'frames': frames}
+        return
+    with profiler.stage(name, frames) as counters:
+        yield counters
@@ -0,0 +1,67 @@
+import time
+import logging
+from pipeline.create_inputs import create_inputs
+from pipeline.frame_store import LazyFrameStore
+from pipeline.parallel import reconstruct_video_parallel
+from pipeline.reconstruction import reconstruct_video
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_reconstruction(frame_store, inputs, output_path, fps=30, workers=1, interpolator=None,
+                       tile_size=None, tile_overlap=64, batch_size="auto", cache=None,
+                       progress_callback=None, **options):
+    """
+    Reconstructs in-process, or in `workers` processes when workers > 1.
+    `options` are passed through (strategy, recursive_min_gap, resample, ...).
+    Returns the number of frames written.
+    """
+    if workers > 1:
+        return reconstruct_video_parallel(frame_store, inputs, output_path, fps=fps, workers=workers,
+                                          tile_size=tile_size, tile_overlap=tile_overlap,
+                                          batch_size=batch_size, cache=cache,
+                                          progress_callback=progress_callback, **options)
+
+    if interpolator is None:
+        from pipeline.google_film.interpolater import get_interpolator
+        interpolator = get_interpolator()
+    return reconstruct_video(frame_store, inputs, output_path, fps=fps, interpolator=interpolator,
+                             batch_size=batch_size, cache=cache, progress_callback=progress_callback,
+                             tile_size=tile_size, tile_overlap=tile_overlap, **options)
+
+
+def reconstruct_files(video_path, indices_path, output_path, **options):
+    """
+    Reconstructs a received keyframe video end to end and returns a report dict.
+    The source frame rate is taken from the index when it records one.
+    See run_reconstruction for `options`; with a `triage` option, its route
+    report is included.
+    """
+    start = time.perf_counter()
+    frame_store, inputs, index = create_inputs(indices_path, video_path)
+    if frame_store is None:
+        raise FileNotFoundError(f"Retained indices not found: {indices_path}")
+    fps = index['fps'] or 30
+    random_access = isinstance(frame_store, LazyFrameStore)
+    prepared = time.perf_counter()
+
+    try:
+        frames_written = run_reconstruction(frame_store, inputs, output_path, fps=fps, **options)
+    finally:
+        frame_store.close()
+
+    report = {
+        'output_path': output_path,
+        'keyframes': len(inputs) + 1 if inputs else 0,
+        'segments': len(inputs),
+        'frames_written': frames_written,
+        'fps': fps,
+        'random_access': random_access,
+        'prepare_seconds': prepared - start,
+        'reconstruct_seconds': time.perf_counter() - prepared,
+    }
+    if options.get('triage') is not None:
+        report['triage'] = options['triage'].report()
+    return report
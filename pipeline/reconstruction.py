@@ -0,0 +1,165 @@
+import numpy as np
+import logging
+from collections import deque
+from pipeline.batch_scheduler import BatchScheduler, auto_batch_size
+from pipeline.profiler import profile_stage
+from pipeline.triage import CHEAP_ROUTES, fill_segment
+from pipeline.video_writer import open_video_writer, to_uint8
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+STRATEGIES = ("linear", "recursive", "auto")
+
+
+def uses_recursion(times_to_interpolate, strategy="linear", recursive_min_gap=8):
+    """
+    Returns whether a gap is filled by recursive midpoints rather than linear dt.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown reconstruction strategy: {strategy}")
+    if times_to_interpolate == 0 or strategy == "linear":
+        return False
+    return strategy == "recursive" or times_to_interpolate >= recursive_min_gap
+
+
+def _iter_segments(frame_store, inputs, plans, model_version, strategy, recursive_min_gap, resample, cache,
+                   triage=None):
+    """
+    Yields the keyframe pair and linear sub-frame times of each segment.
+
+    Segments filled by recursion, by triage or from the cache get no linear work.
+    How each segment is filled is queued on `plans` in segment order.
+    """
+    for input_data in inputs:
+        frame1 = frame_store.get_float(input_data['frame1_index'])
+        frame2 = frame_store.get_float(input_data['frame2_index'])
+
+        times_to_interpolate = input_data['times_to_interpolate']
+        dt = np.linspace(0, 1, num=times_to_interpolate + 2)[1:-1].astype(np.float32)
+        route = triage.route(frame_store, input_data) if triage is not None and times_to_interpolate > 0 else None
+        if route in CHEAP_ROUTES:
+            # Filling these is cheaper than a cache lookup
+            plan = {'method': route, 'count': times_to_interpolate, 'dt': dt}
+            plans.append(plan)
+            yield frame1, frame2, dt[:0]
+            continue
+        if uses_recursion(times_to_interpolate, strategy, recursive_min_gap):
+            plan = {'method': f"recursive-{resample}", 'count': times_to_interpolate}
+        else:
+            plan = {'method': "linear", 'count': times_to_interpolate}
+
+        if cache is not None and times_to_interpolate > 0:
+            plan['key'] = cache.segment_key(frame_store, input_data, dt, model_version, plan['method'])
+            cached = cache.get(plan['key'])
+            if cached is not None:
+                plan['method'], plan['frames'] = "cached", cached
+        plans.append(plan)
+
+        if plan['method'] != "linear":
+            dt = dt[:0]
+        yield frame1, frame2, dt
+
+
+def iter_reconstructed_frames(frame_store, inputs, interpolator, batch_size=1, progress_callback=None,
+                              strategy="linear", recursive_min_gap=8, resample="nearest", cache=None,
+                              triage=None, tile_size=None, tile_overlap=64):
+    """
+    Yields the frames of the reconstructed video in output order.
+
+    Each segment yields its first keyframe followed by the interpolated frames;
+    the last keyframe of the final segment is yielded at the end. Linear work
+    items from neighbouring segments are packed into shared batches by
+    BatchScheduler; recursive segments run one batch per recursion level.
+
+    `strategy` is "linear", "recursive", or "auto", which recurses only for gaps
+    of at least `recursive_min_gap` frames. With a SegmentCache, previously
+    interpolated segments are read back instead of recomputed, and new ones are
+    stored as they complete. With a SegmentTriage, static, near-static and
+    scene-cut segments are filled without the model. `tile_size` and
+    `tile_overlap` are passed to every interpolator call.
+    """
+    if not inputs:
+        return
+
+    if batch_size == "auto":
+        batch_size = auto_batch_size(frame_store.frame_shape)
+    scheduler = BatchScheduler(interpolator, batch_size=batch_size, tile_size=tile_size, tile_overlap=tile_overlap)
+    if any(input_data['times_to_interpolate'] > 0 for input_data in inputs):
+        # Graph tracing for this frame size happens here rather than in the first segment
+        with profile_stage("warmup"):
+            interpolator.warmup(frame_store.frame_shape, tile_size=tile_size, tile_overlap=tile_overlap)
+
+    plans = deque()
+    model_version = interpolator.model_version(tile_size, tile_overlap)
+    segments = _iter_segments(frame_store, inputs, plans, model_version, strategy, recursive_min_gap, resample,
+                              cache, triage)
+
+    frame2 = None
+    cache_hits = 0
+    for i, (frame1, frame2, mid_frames) in enumerate(scheduler.run(segments)):
+        plan = plans.popleft()
+        if plan['method'] == "cached":
+            mid_frames = plan['frames']
+            cache_hits += 1
+        elif plan['method'] in CHEAP_ROUTES:
+            mid_frames = fill_segment(plan['method'], frame1, frame2, plan['dt'])
+        elif plan['method'] != "linear":
+            from pipeline.google_film.interpolater import interpolate_bisection
+            mid_frames = interpolate_bisection(frame1, frame2, plan['count'], interpolator,
+                                               batch_size=batch_size, resample=resample,
+                                               tile_size=tile_size, tile_overlap=tile_overlap)
+        if 'key' in plan and plan['method'] != "cached":
+            cache.put(plan['key'], np.stack([to_uint8(frame) for frame in mid_frames]))
+
+        yield frame1
+        yield from mid_frames
+
+        if len(mid_frames):
+            logger.info(f"Interpolated segment {i}: added {len(mid_frames)} frames ({plan['method']}).")
+        if progress_callback:
+            progress_callback((i + 1) / len(inputs), f"Interpolated segment {i + 1}/{len(inputs)}")
+
+    if frame2 is not None:
+        yield frame2
+    if cache is not None:
+        logger.info(f"Segment cache: {cache_hits} hits.")
+    if triage is not None:
+        report = triage.report()
+        logger.info(f"Triage of {report['segments']} segments: {report['percent']} percent "
+                    f"(thresholds {report['thresholds']}).")
+
+
+def reconstruct_video(frame_store, inputs, output_path, fps=30, interpolator=None, batch_size=1,
+                      queue_size=8, progress_callback=None, strategy="linear", recursive_min_gap=8,
+                      resample="nearest", cache=None, chunk_seconds=None, on_chunk=None, triage=None,
+                      tile_size=None, tile_overlap=64):
+    """
+    Interpolates every segment and streams the frames straight to the encoder.
+
+    Encoding runs on its own thread, so it overlaps with inference, and memory
+    is bounded by `queue_size` frames regardless of the video length.
+    `batch_size` may be an int or "auto" to size batches from free memory.
+    See iter_reconstructed_frames for the strategy, cache, triage and tiling options.
+    With `chunk_seconds`, frames are also written as playable chunks and each
+    finished chunk is passed to `on_chunk` (see ChunkedVideoWriter).
+    Returns the number of frames written.
+    """
+    if interpolator is None:
+        # TensorFlow is only imported once a model is actually needed
+        from pipeline.google_film.interpolater import get_interpolator
+        interpolator = get_interpolator()
+
+    logger.info("Starting interpolation...")
+    with open_video_writer(output_path, fps, queue_size, chunk_seconds, on_chunk) as writer:
+        frames = iter_reconstructed_frames(frame_store, inputs, interpolator, batch_size, progress_callback,
+                                           strategy, recursive_min_gap, resample, cache, triage,
+                                           tile_size, tile_overlap)
+        for frame in frames:
+            writer.write(frame)
+
+    logger.info(f'Final video created with {writer.frames_written} frames')
+    logger.info(f"Interpolator latency: {interpolator.latency_stats()}")
+    return writer.frames_written
@@ -0,0 +1,126 @@
+import logging
+import numpy as np
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Resolution of the reduction slider, in percent
+REDUCTION_STEP_PERCENT = 0.1
+
+
+def _z_scores(values):
+    values = values.astype(np.float64)
+    mean, std = values.mean(), values.std()
+    if std == 0:
+        # No spread: nothing exceeds the threshold at any factor
+        return np.full(len(values), -np.inf), mean, std
+    return (values - mean) / std, mean, std
+
+
+def _step_points(critical):
+    # One factor between each pair of consecutive critical factors, plus one past
+    # either end. Each lands strictly inside a step of the curve, so rounding in
+    # the thresholds cannot flip the pair that defines the step.
+    finite = np.unique(critical[np.isfinite(critical)])
+    if len(finite) == 0:
+        return np.zeros(1)
+    return np.concatenate([[finite[0] - 1], (finite[:-1] + finite[1:]) / 2, [finite[-1] + 1]])
+
+
+class ReductionCurve:
+    """
+    Retained-frame ratio as a function of the adapt factor, for any target reduction.
+
+    KeyframeSelector keeps pair i when diffs[i] > mean + f * std and
+    |deltas[i]| > mean + f * std (each over its own array), i.e. when f is below
+    the pair's critical factor min(z_abs[i], z_delta[i]). The first and last pairs
+    are always kept. Sorting the critical factors once turns every query into a
+    binary search, instead of a full keyframe selection per candidate factor.
+
+    Queries return dicts shaped like set_reductions() entries, with explicit
+    thresholds for select_keyframes. By default every step of the curve is offered,
+    so each retained count is reachable; pass `adapt_factors` to restrict it to a grid.
+    """
+
+    def __init__(self, diffs, adapt_factors=None):
+        diffs = np.asarray(diffs)
+        # Same arithmetic as KeyframeSelector.select_keyframes
+        deltas = np.abs(np.diff(diffs, prepend=diffs[0]))
+
+        z_abs, self.abs_mean, self.abs_std = _z_scores(diffs)
+        z_delta, self.delta_mean, self.delta_std = _z_scores(deltas)
+        critical = np.minimum(z_abs, z_delta)
+        critical[0] = critical[-1] = np.inf
+        self.critical = np.sort(critical)
+        self.pairs = len(diffs)
+
+        if adapt_factors is None:
+            adapt_factors = _step_points(critical)
+        self.factors = np.unique(np.asarray(adapt_factors, dtype=np.float64))
+        self.counts = self.retained(self.factors)
+        # Counts fall as the factor rises; negated, they can be binary searched
+        self._descending = -self.counts
+
+    @classmethod
+    def from_selector(cls, selector, adapt_factors=None):
+        if not selector.metrics_computed:
+            raise RuntimeError("Metrics not computed")
+        return cls(selector.metrics[:, 3], adapt_factors)
+
+    def retained(self, adapt_factor):
+        """
+        Number of frames kept at `adapt_factor` (a scalar or an array).
+        """
+        return self.pairs - np.searchsorted(self.critical, adapt_factor, side="right")
+
+    def thresholds(self, adapt_factor):
+        """
+        Returns the (abs, delta) thresholds select_keyframes derives from `adapt_factor`.
+        """
+        return (self.abs_mean + adapt_factor * self.abs_std,
+                self.delta_mean + adapt_factor * self.delta_std)
+
+    def _entry(self, index):
+        adapt_factor = float(self.factors[index])
+        ratio = self.counts[index] / self.pairs
+        abs_thres, delta_thres = self.thresholds(adapt_factor)
+        return {
+            'reduction_percent': (1 - ratio) * 100,
+            'ratio': ratio,
+            'abs_thres': abs_thres,
+            'delta_thres': delta_thres,
+            'adapt_factor': adapt_factor,
+        }
+
+    @property
+    def min_reduction(self):
+        return (1 - self.counts[0] / self.pairs) * 100
+
+    @property
+    def max_reduction(self):
+        return (1 - self.counts[-1] / self.pairs) * 100
+
+    def _nearest(self, target_reduction):
+        # Index of the offered factor whose count is closest to each target, the
+        # larger count on a tie
+        target_count = (1 - np.asarray(target_reduction, dtype=np.float64) / 100) * self.pairs
+        index = np.searchsorted(self._descending, -target_count)
+        lower = np.clip(index - 1, 0, len(self.counts) - 1)
+        upper = np.clip(index, 0, len(self.counts) - 1)
+        closer = np.abs(self.counts[lower] - target_count) <= np.abs(self.counts[upper] - target_count)
+        return np.where(closer, lower, upper)
+
+    def for_reduction(self, target_reduction):
+        """
+        Returns the achievable setting closest to `target_reduction` percent.
+        """
+        return self._entry(int(self._nearest(target_reduction)))
+
+    def slider_factors(self, step_percent=REDUCTION_STEP_PERCENT):
+        """
+        Returns the adapt factors for_reduction can answer with for targets on a
+        `step_percent` grid, i.e. every setting the reduction slider can select.
+        """
+        targets = np.arange(0, 100 + step_percent / 2, step_percent)
+        return np.unique(self.factors[self._nearest(targets)])
@@ -0,0 +1,21 @@
+import numpy as np
+from pipeline.disk_cache import DiskCache, hash_key
+
+
+class SegmentCache(DiskCache):
+    """
+    Persistent cache of interpolated segments, stored as uint8 frame arrays.
+
+    Entries are content-addressed by the two keyframes, the sub-frame times, the
+    model version and the reconstruction method, so an interrupted or repeated
+    job only recomputes segments that have not been interpolated before.
+    """
+
+    def segment_key(self, frame_store, input_data, dt, model_version, method):
+        return hash_key(
+            frame_store.digest(input_data['frame1_index']),
+            frame_store.digest(input_data['frame2_index']),
+            np.asarray(dt, dtype=np.float32),
+            model_version,
+            method,
+        )
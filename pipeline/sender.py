@@ -0,0 +1,112 @@
+import os
+import uuid
+import shutil
+import tempfile
+import logging
+import cv2
+from pipeline.indices_format import embed_indices
+from pipeline.keyframe_container import embed_frame_index, transcode_intra_only
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi")
+
+
+def load_selector(video_path, metrics=None):
+    """
+    Creates a KeyframeSelector for `video_path`.
+    video_compressor pulls in torch and LPIPS, so it is only imported here.
+
+    With precomputed `metrics`, e.g. from the metrics cache, the selector skips its
+    LPIPS network, which only compute_metrics() needs; it can still select and
+    encode keyframes.
+    """
+    from video_compressor import KeyframeSelector
+    if metrics is None:
+        return KeyframeSelector(video_path, verbose=False)
+
+    from pipeline.metrics_engine import apply_metrics
+    # The state KeyframeSelector.__init__ sets up, minus the LPIPS model it always loads
+    selector = KeyframeSelector.__new__(KeyframeSelector)
+    vars(selector).update({
+        'video_path': video_path, 'verbose': False, 'device': "cpu", 'lpips_model': None,
+        'frame_pairs': 0, 'metrics': None, 'retained_indices': None, 'reductions': [],
+        'metrics_computed': False, 'metric_file_created': False, 'retained_indices_computed': False,
+        'retained_indices_file_created': False, 'output_video_created': False,
+        'metrics_file': None, 'output_video': None,
+        'metrics_dir': "metrics", 'plots_dir': "plots", 'temp_dir': "temp_keyframes", 'output_dir': "output_videos",
+    })
+    selector._ensure_dirs()
+    apply_metrics(selector, metrics)
+    return selector
+
+
+def compress_video(selector, params, identifier=None, output_dir="output_videos", progress_callback=None,
+                   intra_only=False):
+    """
+    Selects keyframes with `params` (abs_thres, delta_thres, adapt_factor), encodes
+    them to `output_dir/<identifier>.mp4` and embeds the retained indices and a
+    frame index.
+
+    With `intra_only`, the keyframe video is re-encoded so that every frame is a
+    keyframe, and the receiver can decode any keyframe pair without decoding the
+    ones before it. The video is then several times larger.
+
+    The selector's scratch directories are private to this call, so several videos
+    can be compressed concurrently. Returns a dict with the identifier, paths and
+    sizes in MB.
+    """
+    identifier = identifier or str(uuid.uuid4())
+    os.makedirs(output_dir, exist_ok=True)
+
+    staging_dir = tempfile.mkdtemp(prefix="compress_", dir=output_dir)
+    selector.temp_dir = os.path.join(staging_dir, "keyframes")
+    selector.output_dir = staging_dir
+    try:
+        selector.select_keyframes(
+            abs_thres=params.get('abs_thres'),
+            delta_thres=params.get('delta_thres'),
+            adapt_factor=params.get('adapt_factor', 1.0)
+        )
+        selector.create_compressed_video(callback=progress_callback)
+        if intra_only:
+            if progress_callback:
+                progress_callback(1.0, "Re-encoding keyframes for random access...")
+            transcode_intra_only(selector.output_video)
+
+        compressed_name = f"{identifier}.mp4"
+        compressed_path = os.path.join(output_dir, compressed_name)
+        os.replace(selector.output_video, compressed_path)
+        logger.info(f"Compressed video written to {compressed_path}")
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    # Embed the retained indices in the keyframe video so a single object is sent
+    cap = cv2.VideoCapture(selector.video_path)
+    embed_indices(
+        compressed_path,
+        selector.retained_indices,
+        fps=cap.get(cv2.CAP_PROP_FPS),
+        frame_count=int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        width=int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        height=int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    )
+    cap.release()
+    frame_index = embed_frame_index(compressed_path)
+
+    # Update selector path so get_sizes works if it checks the file
+    selector.output_video = compressed_path
+    orig_size, comp_size = selector.get_sizes()
+
+    return {
+        'identifier': identifier,
+        'compressed_path': compressed_path,
+        'compressed_name': compressed_name,
+        'retained_frames': len(selector.retained_indices),
+        'intra_only': frame_index['intra_only'],
+        'orig_size': orig_size,
+        'comp_size': comp_size,
+        'reduction': (1 - (comp_size / orig_size)) * 100,
+    }
@@ -0,0 +1,127 @@
+"""Compares linear-dt and recursive-midpoint reconstruction on an original video.
+
+Frames are dropped from the video at several gap sizes, reconstructed with both
+strategies, and scored against the dropped originals.
+
+Usage (from the repository root):
+    python -m pipeline.strategy_comparison original.mp4 --gaps 1 3 7 15 --output comparison.json
+"""
+import argparse
+import json
+import time
+import logging
+import cv2
+import numpy as np
+from pipeline.google_film.interpolater import get_interpolator, interpolate_bisection
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_UINT8_MAX_F = float(np.iinfo(np.uint8).max)
+
+
+def _read_frames(video_path, count):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB).astype(np.float32) / _UINT8_MAX_F)
+    cap.release()
+    return frames
+
+
+def psnr(prediction, target):
+    """
+    Peak signal-to-noise ratio in dB of frames in [0, 1].
+    """
+    mse = np.mean((np.asarray(prediction) - np.asarray(target)) ** 2)
+    return float("inf") if mse == 0 else float(10 * np.log10(1.0 / mse))
+
+
+def compare_strategies(video_path, interpolator, gap_sizes=(1, 3, 7, 15), num_pairs=4, batch_size=None):
+    """
+    Measures throughput and PSNR of both strategies for each gap size.
+    Returns one result dict per (gap, strategy).
+    """
+    results = []
+    for gap in gap_sizes:
+        stride = gap + 1
+        frames = _read_frames(video_path, num_pairs * stride + 1)
+        pairs = (len(frames) - 1) // stride
+        if pairs == 0:
+            logger.warning(f"Video too short for gap {gap}, skipping.")
+            continue
+
+        dt = np.linspace(0, 1, num=gap + 2)[1:-1].astype(np.float32)
+        for strategy in ("linear", "recursive"):
+            scores = []
+            start = time.perf_counter()
+            for p in range(pairs):
+                frame1, frame2 = frames[p * stride], frames[(p + 1) * stride]
+                if strategy == "linear":
+                    predicted = interpolator.interpolate_times(frame1, frame2, dt, batch_size)
+                else:
+                    predicted = interpolate_bisection(frame1, frame2, gap, interpolator, batch_size)
+                scores.append(psnr(predicted, np.stack(frames[p * stride + 1:(p + 1) * stride])))
+            elapsed = time.perf_counter() - start
+
+            result = {
+                'gap': gap,
+                'strategy': strategy,
+                'pairs': pairs,
+                'frames_per_sec': pairs * gap / elapsed,
+                'psnr': float(np.mean(scores)),
+            }
+            logger.info(f"Gap {gap:3d} {strategy:9s}: {result['frames_per_sec']:.2f} frames/sec, "
+                        f"PSNR {result['psnr']:.2f} dB")
+            results.append(result)
+    return results
+
+
+def recommend_min_gap(results, psnr_tolerance=0.1):
+    """
+    Returns the smallest gap from which recursion is at least as fast as linear dt
+    and within `psnr_tolerance` dB of its quality for every larger gap, or None.
+    """
+    by_gap = {}
+    for result in results:
+        by_gap.setdefault(result['gap'], {})[result['strategy']] = result
+
+    recommended = None
+    for gap in sorted(by_gap, reverse=True):
+        linear, recursive = by_gap[gap].get("linear"), by_gap[gap].get("recursive")
+        if not linear or not recursive:
+            continue
+        if (recursive['frames_per_sec'] >= linear['frames_per_sec']
+                and recursive['psnr'] >= linear['psnr'] - psnr_tolerance):
+            recommended = gap
+        else:
+            break
+    return recommended
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare linear and recursive reconstruction strategies.")
+    parser.add_argument("video", help="Original (uncompressed) video to drop frames from")
+    parser.add_argument("--gaps", type=int, nargs="+", default=[1, 3, 7, 15])
+    parser.add_argument("--pairs", type=int, default=4, help="Keyframe pairs per gap size")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--model-path", default=None, help="TFHub handle or local SavedModel directory")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    interpolator = get_interpolator(args.model_path)
+    results = compare_strategies(args.video, interpolator, args.gaps, args.pairs, args.batch_size)
+    recommended = recommend_min_gap(results)
+    logger.info(f"Recommended recursive_min_gap: {recommended}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({'results': results, 'recommended_min_gap': recommended}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import logging
+from collections import Counter
+import cv2
+import numpy as np
+from pipeline.profiler import profile_stage
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ROUTES = ("static", "blend", "cut", "motion")
+
+# Routes filled without the model
+CHEAP_ROUTES = ("static", "blend", "cut")
+
+
+class SegmentTriage:
+    """
+    Routes each segment with a cheap comparison of its two keyframes.
+
+    Keyframes are reduced to small grayscale thumbnails and colour histograms.
+    Pairs whose thumbnails barely differ are "static" (filled by duplication) or
+    "blend" (linear cross-fade); pairs whose histograms differ sharply are scene
+    "cut"s (frames held on each side of the cut). Only the rest, "motion", go to
+    the model.
+
+    The static and blend thresholds apply to the 99th percentile of the absolute
+    thumbnail difference in 0-255 units, so a small object moving over a still
+    background still counts as motion. The cut threshold applies to the Hellinger
+    distance between the histograms, in [0, 1].
+    """
+
+    def __init__(self, static_threshold=2.0, blend_threshold=8.0, cut_threshold=0.5,
+                 thumbnail_size=(64, 36), histogram_bins=8):
+        self.static_threshold = static_threshold
+        self.blend_threshold = blend_threshold
+        self.cut_threshold = cut_threshold
+        self.thumbnail_size = thumbnail_size
+        self.histogram_bins = histogram_bins
+        self.counts = Counter()
+        self._signatures = {}
+
+    def __getstate__(self):
+        # A copy sent to a worker counts only its own segments, for merge()
+        state = self.__dict__.copy()
+        state['counts'] = Counter()
+        state['_signatures'] = {}
+        return state
+
+    def _signature(self, frame_store, index):
+        # Each keyframe ends one segment and starts the next, so keep the last few
+        if index not in self._signatures:
+            frame = frame_store.get(index)
+            thumbnail = cv2.resize(frame, self.thumbnail_size, interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(thumbnail, cv2.COLOR_RGB2GRAY).astype(np.float32)
+            histogram = cv2.calcHist([thumbnail], [0, 1, 2], None, [self.histogram_bins] * 3,
+                                     [0, 256, 0, 256, 0, 256]).ravel()
+            histogram /= max(histogram.sum(), 1.0)
+            self._signatures[index] = (gray, histogram)
+            if len(self._signatures) > 4:
+                del self._signatures[min(self._signatures)]
+        return self._signatures[index]
+
+    def classify(self, frame_store, index1, index2):
+        """
+        Returns (route, thumbnail difference, histogram distance) for a keyframe pair.
+        """
+        gray1, histogram1 = self._signature(frame_store, index1)
+        gray2, histogram2 = self._signature(frame_store, index2)
+        difference = float(np.percentile(np.abs(gray1 - gray2), 99))
+        distance = float(np.sqrt(max(0.0, 1.0 - np.sum(np.sqrt(histogram1 * histogram2)))))
+
+        if difference <= self.static_threshold:
+            route = "static"
+        elif distance >= self.cut_threshold:
+            route = "cut"
+        elif difference <= self.blend_threshold:
+            route = "blend"
+        else:
+            route = "motion"
+        return route, difference, distance
+
+    def route(self, frame_store, input_data):
+        """
+        Classifies a segment and counts it towards the report.
+        """
+        with profile_stage("triage"):
+            route = self.classify(frame_store, input_data['frame1_index'], input_data['frame2_index'])[0]
+        self.counts[route] += 1
+        return route
+
+    def merge(self, counts):
+        """
+        Adds route counts collected elsewhere, e.g. by a worker process.
+        """
+        self.counts.update(counts)
+
+    def report(self):
+        """
+        Returns the thresholds and the share of segments routed to each path.
+        """
+        total = sum(self.counts.values())
+        return {
+            'thresholds': {
+                'static': self.static_threshold,
+                'blend': self.blend_threshold,
+                'cut': self.cut_threshold,
+            },
+            'segments': total,
+            'counts': {route: self.counts[route] for route in ROUTES},
+            'percent': {route: round(100 * self.counts[route] / total, 1) if total else 0.0 for route in ROUTES},
+        }
+
+
+def fill_segment(route, frame1, frame2, dt):
+    """
+    Synthesises the frames of a cheaply routed segment at sub-frame times `dt`.
+    """
+    if route == "static":
+        return [frame1] * len(dt)
+    if route == "blend":
+        return [(1 - t) * frame1 + t * frame2 for t in dt]
+    if route == "cut":
+        # Hold each side up to the midpoint rather than morphing across the cut
+        return [frame1 if t < 0.5 else frame2 for t in dt]
+    raise ValueError(f"Route {route!r} is not filled without the model")
@@ -0,0 +1,266 @@
+import os
+import math
+import queue
+import shutil
+import tempfile
+import threading
+import subprocess
+import logging
+import numpy as np
+from pipeline.profiler import current_profiler, profile_stage
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_UINT8_MAX_F = float(np.iinfo(np.uint8).max)
+_END_OF_STREAM = object()
+
+
+def to_uint8(frame):
+    """
+    Converts a float frame in [0, 1] to uint8. uint8 frames are returned unchanged.
+    """
+    frame = np.asarray(frame)
+    if frame.dtype == np.uint8:
+        return frame
+    return np.clip(frame * _UINT8_MAX_F + 0.5, 0, _UINT8_MAX_F).astype(np.uint8)
+
+
+class StreamingVideoWriter:
+    """
+    Encodes frames incrementally on a background thread.
+
+    Frames are converted to uint8 as soon as they are written and handed to the
+    encoder thread through a bounded queue, so encoding overlaps with whatever
+    produces the frames and at most `max_queue` frames are held in memory.
+
+    Usage:
+        with StreamingVideoWriter("out.mp4", fps=30) as writer:
+            for frame in frames:
+                writer.write(frame)
+
+    If the `with` block raises, the partial output is removed.
+    """
+
+    def __init__(self, output_path, fps=30, max_queue=8, **writer_kwargs):
+        self.output_path = output_path
+        self.fps = fps
+        self.frames_written = 0
+        self._writer_kwargs = writer_kwargs
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._error = None
+        self._closed = False
+        # The encoder thread does not inherit context, so capture the job's profiler here
+        self._profiler = current_profiler()
+        self._thread = threading.Thread(target=self._encode_loop, name="video-encoder", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def _encode_loop(self):
+        writer = None
+        try:
+            # Imported here so that importing this module stays cheap
+            import mediapy as media
+
+            while True:
+                frame = self._queue.get()
+                if frame is _END_OF_STREAM:
+                    break
+                if writer is None:
+                    writer = self._open_writer(media, frame.shape[:2])
+                with profile_stage("encode", frames=1, profiler=self._profiler):
+                    writer.add_image(frame)
+                self.frames_written += 1
+                writer = self._frame_written(writer)
+        except Exception as e:
+            logger.error(f"Video encoder failed: {e}")
+            self._error = e
+            # Drain so producers blocked on a full queue can observe the error.
+            while self._queue.get() is not _END_OF_STREAM:
+                pass
+        finally:
+            if writer is not None:
+                self._close_writer(writer)
+
+    def _open_writer(self, media, shape):
+        writer = media.VideoWriter(self.output_path, shape=shape, fps=self.fps, **self._writer_kwargs)
+        writer.__enter__()
+        return writer
+
+    def _frame_written(self, writer):
+        """
+        Called after each encoded frame. Returns the writer for the next frame, or None to open a new one.
+        """
+        return writer
+
+    def _close_writer(self, writer):
+        writer.__exit__(None, None, None)
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise RuntimeError(f"Video encoding failed: {self._error}") from self._error
+
+    def write(self, frame):
+        """
+        Queues a frame for encoding. Blocks while the queue is full.
+        """
+        if self._closed:
+            raise RuntimeError("Cannot write to a closed StreamingVideoWriter")
+        self._raise_if_failed()
+        with profile_stage("to_uint8", frames=1, profiler=self._profiler):
+            frame = to_uint8(frame)
+        self._queue.put(frame)
+
+    def close(self):
+        """
+        Flushes the remaining frames and waits for the encoder to finish.
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_END_OF_STREAM)
+            self._thread.join()
+            logger.info(f"Encoded {self.frames_written} frames to {self.output_path}")
+        self._raise_if_failed()
+
+    def abort(self):
+        """
+        Stops the encoder after the producer failed or was cancelled, and removes the
+        partial output so it cannot be mistaken for a finished video.
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_END_OF_STREAM)
+            self._thread.join()
+        if self._error is not None:
+            # The producer's exception is the one the caller sees
+            logger.error(f"Video encoder also failed: {self._error}")
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+        logger.info(f"Discarded unfinished {self.output_path}")
+
+
+class ChunkedVideoWriter(StreamingVideoWriter):
+    """
+    Encodes frames into independently playable MP4 chunks of `chunk_seconds` each.
+
+    Each finished chunk is added to `playlist.m3u8` in `chunk_dir` and passed to
+    `on_chunk`, so playback can start while later frames are still being produced.
+    On close the chunks are joined, without re-encoding, into `output_path`; if
+    the `with` block raises, the chunks are discarded instead.
+    """
+
+    def __init__(self, output_path, fps=30, chunk_seconds=2.0, chunk_dir=None, on_chunk=None,
+                 max_queue=8, **writer_kwargs):
+        self.chunk_dir = chunk_dir or f"{os.path.splitext(output_path)[0]}_chunks"
+        self.chunk_frames = max(1, round(chunk_seconds * fps))
+        self.playlist_path = os.path.join(self.chunk_dir, "playlist.m3u8")
+        self.chunks = []
+        self._on_chunk = on_chunk
+        self._chunk_start = 0
+        # Chunks left by an earlier run of the same output would mix into the playlist
+        shutil.rmtree(self.chunk_dir, ignore_errors=True)
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        super().__init__(output_path, fps=fps, max_queue=max_queue, **writer_kwargs)
+
+    def _open_writer(self, media, shape):
+        self._chunk_path = os.path.join(self.chunk_dir, f"chunk_{len(self.chunks):05d}.mp4")
+        self._chunk_start = self.frames_written
+        writer = media.VideoWriter(self._chunk_path, shape=shape, fps=self.fps, **self._writer_kwargs)
+        writer.__enter__()
+        return writer
+
+    def _frame_written(self, writer):
+        if self.frames_written - self._chunk_start >= self.chunk_frames:
+            self._close_writer(writer)
+            return None
+        return writer
+
+    def _close_writer(self, writer):
+        writer.__exit__(None, None, None)
+        chunk = {
+            'index': len(self.chunks),
+            'path': self._chunk_path,
+            'start_seconds': self._chunk_start / self.fps,
+            'duration_seconds': (self.frames_written - self._chunk_start) / self.fps,
+        }
+        self.chunks.append(chunk)
+        self._write_playlist(ended=False)
+        if self._on_chunk:
+            self._on_chunk(chunk)
+
+    def _write_playlist(self, ended):
+        target = math.ceil(max((chunk['duration_seconds'] for chunk in self.chunks), default=1))
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{target}", "#EXT-X-PLAYLIST-TYPE:EVENT"]
+        for chunk in self.chunks:
+            lines += [f"#EXTINF:{chunk['duration_seconds']:.3f},", os.path.basename(chunk['path'])]
+        if ended:
+            lines.append("#EXT-X-ENDLIST")
+        # Replace atomically so players polling the playlist never see a partial file
+        temp_path = f"{self.playlist_path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.playlist_path)
+
+    def close(self):
+        """
+        Flushes the last chunk, finalises the playlist and joins the chunks into
+        `output_path`. The chunks are removed once joined.
+        """
+        if self._closed:
+            self._raise_if_failed()
+            return
+        super().close()
+        self._write_playlist(ended=True)
+        with profile_stage("concat_chunks", frames=self.frames_written, profiler=self._profiler):
+            concat_chunks([chunk['path'] for chunk in self.chunks], self.output_path)
+        shutil.rmtree(self.chunk_dir, ignore_errors=True)
+
+    def abort(self):
+        """
+        Discards the chunks as well as the partial output.
+        """
+        super().abort()
+        shutil.rmtree(self.chunk_dir, ignore_errors=True)
+
+def concat_chunks(chunk_paths, output_path):
+    """
+    Joins MP4 chunks with identical encoding settings into one file, without re-encoding.
+    """
+    if not chunk_paths:
+        return
+    if len(chunk_paths) == 1:
+        shutil.copyfile(chunk_paths[0], output_path)
+        return
+    fd, list_path = tempfile.mkstemp(suffix=".txt", prefix="chunks_")
+    try:
+        with os.fdopen(fd, "w") as f:
+            for path in chunk_paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+             "-c", "copy", output_path],
+            check=True, stdout=subprocess.DEVNULL
+        )
+    finally:
+        os.remove(list_path)
+    logger.info(f"Joined {len(chunk_paths)} chunks into {output_path}")
+
+
+def open_video_writer(output_path, fps=30, max_queue=8, chunk_seconds=None, on_chunk=None):
+    """
+    Returns a ChunkedVideoWriter when `chunk_seconds` is set, else a StreamingVideoWriter.
+    """
+    if chunk_seconds:
+        return ChunkedVideoWriter(output_path, fps=fps, chunk_seconds=chunk_seconds, on_chunk=on_chunk,
+                                  max_queue=max_queue)
+    return StreamingVideoWriter(output_path, fps=fps, max_queue=max_queue)